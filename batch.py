@@ -0,0 +1,182 @@
+"""Generate many pieces at once across a process pool.
+
+Each worker process imports the generators once and then writes its share
+of the pieces, so interpreter startup and the ``mido`` import are paid per
+worker instead of per file.
+
+With ``--dedup`` every piece's melody is checked against the pieces already
+accepted (and those in ``--dedup-index``, if given); near-duplicates are
+dropped and their slot is generated again with a retry seed (see
+``retry_seed``).  The file name holds the seed the piece was made from.
+
+``--metrics`` records stage times and counters in every worker (see
+``instrumentation``) and writes the batch totals as JSON or Prometheus text;
+``--profile-slowest K`` also profiles the K slowest pieces.
+
+    python batch.py happy moody --count 10000 --out catalog --workers 8
+    python batch.py happy --count 10000 --out catalog --dedup-index catalog.lsh
+    python batch.py happy --count 10000 --out catalog --metrics metrics.prom --profile-slowest 5
+"""
+import argparse
+import contextlib
+import functools
+import os
+import random
+from concurrent.futures import ProcessPoolExecutor
+
+import dedup
+import engine
+import instrumentation
+import smf_writer
+
+
+def _generate_to_file(job):
+    mood, seed, bars, out_dir = job
+    path = os.path.join(out_dir, f"{mood}_{seed}.mid")
+    data = engine.generate_bytes(mood, seed, bars)
+    with instrumentation.stage('write'), open(path, 'wb') as f:
+        f.write(data)
+    return path
+
+
+@functools.lru_cache(maxsize=None)
+def _hasher(num_perm, seed):
+    return dedup.MinHasher(num_perm, seed)
+
+
+def _generate_candidate(job):
+    # Generate a piece without writing it, plus the sketch of its main melody
+    mood, seed, bars, num_perm, hash_seed = job
+    tracks, _ = engine.compose_events(mood, seed, bars)
+    with instrumentation.stage('encode'):
+        data = smf_writer.encode_file(tracks, engine.mood_module(mood).tempo)
+    return data, _hasher(num_perm, hash_seed).melody_signature(dedup.melody_from_events(tracks[0]))
+
+
+def _measured(task):
+    # Run one job with a fresh recorder; return its result and the recorder's snapshot
+    function, job = task
+    with instrumentation.recording() as recorder, recorder.piece(job[:3]):
+        result = function(job)
+    return result, recorder.snapshot()
+
+
+def _map(pool, function, jobs, chunksize, metrics):
+    if metrics is None:
+        return pool.map(function, jobs, chunksize=chunksize)
+    return _unpack(pool.map(_measured, [(function, job) for job in jobs], chunksize=chunksize), metrics)
+
+
+def _unpack(results, metrics):
+    for result, snapshot in results:
+        metrics.merge(snapshot)
+        yield result
+
+
+def retry_seed(seed, attempt):
+    """Return the seed for regenerating the piece of ``seed`` after ``attempt`` rejections.
+
+    Retry seeds are drawn from ``(seed, attempt)`` and have bit 63 set, so
+    they never equal a primary seed of this or any other batch.
+    """
+    return (1 << 63) | random.Random(f"retry:{seed}:{attempt}").getrandbits(63)
+
+
+def batch_jobs(moods, count, bars=16, start_seed=0):
+    """Yield ``(mood, seed, bars)`` for ``count`` pieces, cycling through ``moods``."""
+    for i in range(count):
+        yield moods[i % len(moods)], start_seed + i, bars
+
+
+def generate_batch(moods, count, out_dir, bars=16, start_seed=0, workers=None, dedup_index=None, max_attempts=10,
+                   metrics=None):
+    """Write ``count`` pieces to ``out_dir`` and return their paths in job order.
+
+    With a ``dedup.MelodyLSH`` as ``dedup_index``, near-duplicates are
+    regenerated with ``retry_seed`` seeds, up to ``max_attempts`` times per
+    piece; pieces that never come out unique are left out.  With
+    an ``instrumentation.Recorder`` as ``metrics``, every worker records its
+    pieces and the totals are merged into it.
+    """
+    for mood in moods:
+        engine.mood_module(mood)
+    os.makedirs(out_dir, exist_ok=True)
+    jobs = list(batch_jobs(moods, count, bars, start_seed))
+    workers = workers or os.cpu_count() or 1
+    # Hand out work in a few large chunks per worker to keep IPC overhead low
+    chunksize = max(1, len(jobs) // (workers * 4))
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        if dedup_index is None:
+            return list(_map(pool, _generate_to_file, [job + (out_dir,) for job in jobs], chunksize, metrics))
+        # With dedup the parent writes the files, so record its stages too
+        with instrumentation.recording(metrics) if metrics is not None else contextlib.nullcontext():
+            return _generate_unique(pool, jobs, out_dir, dedup_index, max_attempts, chunksize, metrics)
+
+
+def _generate_unique(pool, jobs, out_dir, index, max_attempts, chunksize, metrics=None):
+    # Results are checked in job order, so which piece of a near-duplicate pair
+    # is kept does not depend on worker timing
+    paths = [None] * len(jobs)
+    pending = list(range(len(jobs)))
+    for attempt in range(max_attempts):
+        if not pending:
+            break
+        work = [(mood, seed if attempt == 0 else retry_seed(seed, attempt), bars)
+                for mood, seed, bars in (jobs[slot] for slot in pending)]
+        results = _map(pool, _generate_candidate, [job + (index.hasher.num_perm, index.seed) for job in work],
+                       max(1, min(chunksize, len(work) // 16)), metrics)
+        rejected = []
+        for slot, (mood, seed, _), (data, signature) in zip(pending, work, results):
+            path = os.path.join(out_dir, f"{mood}_{seed}.mid")
+            if index.add_if_unique(path, signature):
+                rejected.append(slot)
+                continue
+            with instrumentation.stage('write'), open(path, 'wb') as f:
+                f.write(data)
+            paths[slot] = path
+        pending = rejected
+    return [path for path in paths if path is not None]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('moods', nargs='+', choices=sorted(engine.moods))
+    parser.add_argument('--count', type=int, default=100)
+    parser.add_argument('--bars', type=int, default=16)
+    parser.add_argument('--start-seed', type=int, default=0)
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--out', default='.')
+    parser.add_argument('--dedup', action='store_true', help='regenerate pieces whose melody is a near-duplicate')
+    parser.add_argument('--dedup-index', default=None, help='LSH index (.npz) of earlier pieces to check against and extend')
+    parser.add_argument('--metrics', default=None, help='write stage times and counters here (.json, or .prom for Prometheus)')
+    parser.add_argument('--profile-slowest', type=int, default=0, metavar='K',
+                        help='profile the K slowest pieces again with cProfile and tracemalloc (needs --metrics)')
+    args = parser.parse_args(argv)
+    if args.profile_slowest and not args.metrics:
+        parser.error('--profile-slowest needs --metrics')
+
+    index = None
+    if args.dedup_index and os.path.exists(args.dedup_index):
+        index = dedup.MelodyLSH.load(args.dedup_index)
+    elif args.dedup or args.dedup_index:
+        index = dedup.MelodyLSH()
+    metrics = instrumentation.Recorder() if args.metrics else None
+    paths = generate_batch(args.moods, args.count, args.out, args.bars, args.start_seed, args.workers, index,
+                           metrics=metrics)
+    print(f"Saved {len(paths)} pieces to {args.out}")
+    if metrics is not None:
+        metrics.export(args.metrics)
+        print(f"Metrics saved to {args.metrics}")
+        if args.profile_slowest:
+            directory = os.path.join(args.out, 'profiles')
+            instrumentation.profile_pieces([label for _, label in metrics.slowest(args.profile_slowest)], directory)
+            print(f"Profiles of the {args.profile_slowest} slowest pieces saved to {directory}")
+    if index is not None:
+        print(f"{index.rejected} near-duplicates rejected, "
+              f"{args.count - len(paths)} pieces given up")
+        if args.dedup_index:
+            index.save(args.dedup_index)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,53 @@
+"""Wall time of best-of-N generation against generating a single piece.
+
+For each candidate count, ``best_of.best_piece`` runs on a warmed-up
+process pool of ``--workers`` processes.  The time is compared with
+``engine.generate_bytes`` for one piece.  Also reports how much the best
+score gains over the requested seed's own score:
+
+    python -m benchmarks.bench_best_of --candidates 1 8 64 --workers 8
+"""
+import argparse
+import os
+import statistics
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import best_of
+import engine
+
+
+def _timed(function, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        times.append(time.perf_counter() - start)
+    return statistics.median(times), result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--moods', nargs='+', default=sorted(engine.moods), choices=sorted(engine.moods))
+    parser.add_argument('--candidates', nargs='+', type=int, default=[1, 8, 64])
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--bars', type=int, default=16)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args(argv)
+
+    with ProcessPoolExecutor(max_workers=args.workers) as executor:
+        # Start every worker and import the generators before timing
+        list(executor.map(best_of.candidate_features, args.moods * args.workers,
+                          range(len(args.moods) * args.workers)))
+        for mood in args.moods:
+            single, _ = _timed(lambda: engine.generate_bytes(mood, 0, args.bars), args.repeat)
+            print(f"{mood:10s} single piece {single * 1000:7.1f}ms")
+            for count in args.candidates:
+                seconds, (_, result) = _timed(
+                    lambda: best_of.best_piece(mood, 0, args.bars, count, executor, args.workers), args.repeat)
+                print(f"{mood:10s} best of {count:3d} {seconds * 1000:7.1f}ms  ({seconds / single:5.1f}x single)  "
+                      f"score {result['score']:.3f} vs {result['scores'][0]:.3f} for the requested seed")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,67 @@
+"""Memory and GC cost of the ways a piece's events can be held.
+
+Generates a piece with ``--notes`` notes per melodic track and measures
+each representation of its events with tracemalloc: ``mido.Message``
+objects in ``MidiTrack``s, one list of ints per event (what live playback
+used to queue), the ``(n, 4)`` int64 event arrays and ``EventBuffer``s.
+Sizes are scaled to 1M notes.  Each representation is kept alive while a
+full ``gc.collect()`` is timed, since a long-running worker pays that cost
+on every collection:
+
+    python -m benchmarks.bench_events --notes 200000
+"""
+import argparse
+import gc
+import time
+import tracemalloc
+
+import engine
+import smf_writer
+from event_buffer import EventBuffer
+
+
+def _messages(events):
+    return [[status, data1] if status & 0xF0 in (0xC0, 0xD0) else [status, data1, data2]
+            for _, status, data1, data2 in events.tolist()]
+
+
+representations = {
+    'mido': lambda tracks: [EventBuffer(events).to_midi_track() for events in tracks],
+    'int lists': lambda tracks: [_messages(events) for events in tracks],
+    'int64 array': lambda tracks: [events.copy() for events in tracks],
+    'EventBuffer': lambda tracks: [EventBuffer(events) for events in tracks],
+}
+
+
+def measure(build, tracks):
+    gc.collect()
+    tracemalloc.start()
+    held = build(tracks)
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    start = time.perf_counter()
+    gc.collect()
+    collect = time.perf_counter() - start
+    del held
+    return size, collect
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--mood', default='happy', choices=sorted(engine.moods))
+    parser.add_argument('--notes', type=int, default=100000, help='notes per melodic track')
+    args = parser.parse_args(argv)
+
+    module = engine.mood_module(args.mood)
+    tracks, _ = engine.compose_events(args.mood, 0, -(-args.notes // module.notes_per_bar))
+    notes = sum(int((events[:, 1] & 0xF0 == smf_writer.NOTE_ON).sum()) for events in tracks)
+    print(f"{args.mood}: {len(tracks)} tracks, {notes} notes, {sum(map(len, tracks))} events")
+    scale = 1e6 / notes
+    for name, build in representations.items():
+        size, collect = measure(build, tracks)
+        print(f"{name:12s} {size * scale / 1e6:8.1f} MB per 1M notes  {size / notes:6.1f} B/note  "
+              f"gc.collect {collect * 1000:7.1f} ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,60 @@
+"""Build, refresh and query a library index over freshly generated pieces.
+
+Generates ``--count`` pieces with ``batch.generate_batch`` into a temporary
+library, then times a full index build, a no-op update, an update after
+touching ``--touch`` files and a set of typical queries:
+
+    python -m benchmarks.bench_index --count 20000
+"""
+import argparse
+import os
+import tempfile
+import time
+
+import batch
+import engine
+import library_index
+
+queries = [
+    {'key': 'C major'},
+    {'bpm': (100, 115)},
+    {'program': [1, 5, 11]},
+    {'pitch': (40, 90), 'duration': (20, None)},
+    {'bpm': (70, 80), 'key': 'C minor', 'density': (5, 30)},
+]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--count', type=int, default=20000, help='pieces in the library')
+    parser.add_argument('--touch', type=int, default=100, help='files modified before the incremental update')
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--repeat', type=int, default=100, help='runs per query')
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as directory:
+        library = os.path.join(directory, 'library')
+        batch.generate_batch(sorted(engine.moods), args.count, library, workers=args.workers)
+        index = library_index.LibraryIndex(os.path.join(directory, 'index'))
+
+        for label in ('full build', 'no-op update'):
+            counts = index.update(library, args.workers)
+            print(f"{label:20s} {counts['seconds']:8.3f}s  {counts['parsed']} parsed of {counts['files']}")
+        for name in sorted(os.listdir(library))[:args.touch]:
+            os.utime(os.path.join(library, name))
+        counts = index.update(library, args.workers)
+        print(f"{'incremental update':20s} {counts['seconds']:8.3f}s  {counts['parsed']} parsed of {counts['files']}")
+
+        start = time.perf_counter()
+        index = library_index.LibraryIndex(index.directory)
+        print(f"{'open index':20s} {(time.perf_counter() - start) * 1000:8.3f}ms  {len(index)} rows")
+        for conditions in queries:
+            start = time.perf_counter()
+            for _ in range(args.repeat):
+                rows = index.select(**conditions)
+            elapsed = (time.perf_counter() - start) / args.repeat
+            print(f"{elapsed * 1000:8.3f}ms  {len(rows):7d} matches  {conditions}")
+
+
+if __name__ == '__main__':
+    main()
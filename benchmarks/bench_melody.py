@@ -0,0 +1,62 @@
+"""Compare the pure-Python and NumPy melody generators.
+
+Times ``generate_register_changing_melody`` against
+``fast_melody.mood_melodies`` for every mood and checks that both produce the
+same pitch and interval statistics.  Run from the repository root:
+
+    python -m benchmarks.bench_melody --count 5000 --bars 16
+"""
+import argparse
+import random
+import time
+
+import numpy as np
+
+import engine
+import fast_melody
+
+
+def python_melodies(module, count, length, seed):
+    rng = random.Random(seed)
+    scales = list(module.scales.values()) if len(module.scales) > 1 else []
+    melodies = []
+    for _ in range(count):
+        registers = module.scale_registers(rng.choice(scales)) if scales else module.registers
+        melodies.append(module.generate_register_changing_melody(length, segment_size=6, registers=registers, rng=rng))
+    return np.array(melodies)
+
+
+def histogram_distance(a, b, bins):
+    # Total variation distance between two empirical distributions
+    ha = np.bincount(a.ravel(), minlength=bins) / a.size
+    hb = np.bincount(b.ravel(), minlength=bins) / b.size
+    return 0.5 * np.abs(ha - hb).sum()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--count', type=int, default=2000)
+    parser.add_argument('--bars', type=int, default=16)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args(argv)
+    length = args.bars * 8
+
+    for mood, module in engine.moods.items():
+        start = time.perf_counter()
+        slow = python_melodies(module, args.count, length, args.seed)
+        python_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        fast, _ = fast_melody.mood_melodies(module, args.count, length, np.random.default_rng(args.seed))
+        numpy_time = time.perf_counter() - start
+
+        pitch_tv = histogram_distance(slow, fast, 128)
+        interval_tv = histogram_distance(np.abs(np.diff(slow)), np.abs(np.diff(fast)).astype(int), 128)
+        print(f"{mood:10s} python {args.count / python_time:10.0f} melodies/s   "
+              f"numpy {args.count / numpy_time:10.0f} melodies/s   "
+              f"speedup {python_time / numpy_time:6.1f}x   "
+              f"pitch TV {pitch_tv:.3f}   interval TV {interval_tv:.3f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,190 @@
+"""Stage-level benchmarks for the three mood generators.
+
+For every mood and piece length this times each stage of building a piece
+separately: melody generation, harmony/complementary derivation (including
+the octave layers), ``add_notes``, ``add_percussion`` and ``mid.save``.  It
+also measures end-to-end files/sec for 1..N pieces through the mido path
+(``engine.generate`` + save) and the direct writer (``engine.generate_bytes``).
+
+Each configuration runs in a fresh worker process so its peak RSS can be
+reported.  Results are written as JSON, and two result files can be
+compared to spot regressions between commits:
+
+    python -m benchmarks.bench_stages --bars 16 256 4096 --pieces 1 100 --out before.json
+    python -m benchmarks.bench_stages --compare before.json after.json
+"""
+import argparse
+import io
+import json
+import multiprocessing
+import platform
+import random
+import resource
+import subprocess
+import sys
+import time
+import tracemalloc
+
+from mido import MidiFile, MidiTrack, MetaMessage
+
+import engine
+import scale_tables
+
+stages = ['melody', 'harmony', 'add_notes', 'add_percussion', 'save']
+
+
+def run_stages(module, bars, seed, trace=False):
+    """Build one piece stage by stage; return ``(seconds per stage, notes, allocations per stage)``."""
+    rng = random.Random(seed)
+    # Registers and harmony table of one piece, as compose_events picks them
+    _, registers, table = module.pick_scale(rng)
+    timings, allocations = {}, {}
+    state = {}
+
+    def melody():
+        state['melody'] = module.generate_register_changing_melody(bars * module.notes_per_bar, segment_size=6,
+                                                                   registers=registers, rng=rng)
+
+    def harmony():
+        melody = state['melody']
+        state['voices'] = [melody,
+                           scale_tables.octave_down[melody].tolist(),
+                           scale_tables.octave_up[melody].tolist(),
+                           module.generate_background_melody(melody, table),
+                           module.generate_complementary_melody(melody, table)]
+
+    def add_notes():
+        tracks = [MidiTrack() for _ in range(6)]
+        for channel, track, voice in zip((0, 1, 2, 3, 4), (0, 1, 2, 3, 5), state['voices']):
+            module.add_notes(tracks[track], channel, voice, is_main=channel != 3, rng=rng)
+        state['tracks'] = tracks
+
+    def add_percussion():
+        # Percussion for the whole piece, so its cost scales with the bar count
+        module.add_percussion(state['tracks'][4], bars, rng=rng)
+
+    def save():
+        mid = MidiFile(ticks_per_beat=480)
+        for track in state['tracks']:
+            track.insert(0, MetaMessage('set_tempo', tempo=module.tempo))
+            mid.tracks.append(track)
+        mid.save(file=io.BytesIO())
+
+    for name, stage in zip(stages, (melody, harmony, add_notes, add_percussion, save)):
+        if trace:
+            tracemalloc.start()
+            blocks = sys.getallocatedblocks()
+        start = time.perf_counter()
+        stage()
+        timings[name] = time.perf_counter() - start
+        if trace:
+            # Blocks the stage left allocated (e.g. Message objects) and its peak traced memory
+            allocations[name] = {'live_blocks': sys.getallocatedblocks() - blocks,
+                                 'peak_bytes': tracemalloc.get_traced_memory()[1]}
+            tracemalloc.stop()
+    notes = sum(len(track) for track in state['tracks']) // 2
+    return timings, notes, allocations
+
+
+def bench_stages(mood, bars, repeat):
+    module = engine.mood_module(mood)
+    totals = dict.fromkeys(stages, 0.0)
+    notes = 0
+    for seed in range(repeat):
+        timings, notes, _ = run_stages(module, bars, seed)
+        for name in stages:
+            totals[name] += timings[name]
+    _, _, allocations = run_stages(module, bars, repeat, trace=True)
+    result = {'mood': mood, 'bars': bars, 'notes': notes, 'stages': {}}
+    for name in stages:
+        seconds = totals[name] / repeat
+        result['stages'][name] = {
+            'seconds': seconds,
+            'notes_per_sec': notes / seconds if seconds else None,
+            'allocations_per_note': allocations[name]['live_blocks'] / notes,
+            'peak_bytes_per_note': allocations[name]['peak_bytes'] / notes,
+        }
+    result['peak_rss_kb'] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return result
+
+
+def bench_pieces(mood, bars, pieces):
+    result = {'mood': mood, 'bars': bars, 'pieces': pieces}
+    start = time.perf_counter()
+    for seed in range(pieces):
+        engine.generate(mood, seed, bars).save(file=io.BytesIO())
+    result['mido_files_per_sec'] = pieces / (time.perf_counter() - start)
+    start = time.perf_counter()
+    for seed in range(pieces):
+        engine.generate_bytes(mood, seed, bars)
+    result['direct_files_per_sec'] = pieces / (time.perf_counter() - start)
+    result['peak_rss_kb'] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return result
+
+
+def _isolated(function, *args):
+    # One fresh process per configuration keeps peak RSS readings independent
+    with multiprocessing.get_context('spawn').Pool(1, maxtasksperchild=1) as pool:
+        return pool.apply(function, args)
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(before_path, after_path):
+    with open(before_path) as f:
+        before = json.load(f)
+    with open(after_path) as f:
+        after = json.load(f)
+    old = {(r['mood'], r['bars']): r for r in before['stages']}
+    print(f"{'mood':10s} {'bars':>6s} {'stage':15s} {'before ms':>10s} {'after ms':>10s} {'speedup':>8s}")
+    for result in after['stages']:
+        previous = old.get((result['mood'], result['bars']))
+        if previous is None:
+            continue
+        for name in stages:
+            a = previous['stages'][name]['seconds'] * 1000
+            b = result['stages'][name]['seconds'] * 1000
+            print(f"{result['mood']:10s} {result['bars']:6d} {name:15s} {a:10.3f} {b:10.3f} {a / b if b else float('inf'):7.2f}x")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--moods', nargs='+', default=sorted(engine.moods), choices=sorted(engine.moods))
+    parser.add_argument('--bars', nargs='+', type=int, default=[16, 256, 4096])
+    parser.add_argument('--pieces', nargs='+', type=int, default=[1, 100])
+    parser.add_argument('--repeat', type=int, default=5, help='pieces averaged per stage timing')
+    parser.add_argument('--out', default=None, help='write results as JSON to this file')
+    parser.add_argument('--compare', nargs=2, metavar=('BEFORE', 'AFTER'), help='compare two result files')
+    args = parser.parse_args(argv)
+
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    results = {'commit': git_commit(), 'python': platform.python_version(), 'time': time.time(),
+               'stages': [], 'pieces': []}
+    for mood in args.moods:
+        for bars in args.bars:
+            result = _isolated(bench_stages, mood, bars, args.repeat)
+            results['stages'].append(result)
+            cells = '  '.join(f"{name} {result['stages'][name]['seconds'] * 1000:8.2f}ms" for name in stages)
+            print(f"{mood:10s} {bars:6d} bars {result['notes']:7d} notes  {cells}  rss {result['peak_rss_kb'] // 1024}MB")
+        for pieces in args.pieces:
+            result = _isolated(bench_pieces, mood, 16, pieces)
+            results['pieces'].append(result)
+            print(f"{mood:10s} {pieces:6d} pieces  mido {result['mido_files_per_sec']:8.1f} files/s  "
+                  f"direct {result['direct_files_per_sec']:8.1f} files/s")
+
+    if args.out:
+        with open(args.out, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"Saved {args.out}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,62 @@
+"""Time complete command line runs that each write one 16-bar piece.
+
+Every run is a fresh interpreter, timed from spawn to exit.  The runs
+compared are:
+
+* ``script``: the mood script, e.g. ``python Happy.py SEED``
+* ``cold``: ``music_gen.py --no-daemon``, which imports the generators lazily
+* ``warm``: ``music_gen.py`` with a warm daemon on a private socket
+
+``python -c pass`` is timed too, as the floor set by interpreter startup:
+
+    python -m benchmarks.bench_startup --runs 20
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+repo = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+scripts = {'happy': 'Happy.py', 'moody': 'Moody.py', 'energetic': 'energetic.py'}
+
+
+def _wall(command, cwd, runs):
+    times = []
+    for seed in range(runs):
+        start = time.perf_counter()
+        subprocess.run([part.format(seed=seed) for part in command], cwd=cwd, check=True, stdout=subprocess.DEVNULL)
+        times.append(time.perf_counter() - start)
+    return statistics.median(times), min(times)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--mood', default='happy', choices=sorted(scripts))
+    parser.add_argument('--runs', type=int, default=10)
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as directory:
+        sock = os.path.join(directory, 'daemon.sock')
+        tool = os.path.join(repo, 'music_gen.py')
+        commands = {
+            'python -c pass': [sys.executable, '-c', 'pass'],
+            'script': [sys.executable, os.path.join(repo, scripts[args.mood]), '{seed}'],
+            'cold': [sys.executable, tool, args.mood, '--seed', '{seed}', '--no-daemon'],
+            'warm': [sys.executable, tool, args.mood, '--seed', '{seed}', '--socket', sock],
+        }
+        daemon = subprocess.Popen([sys.executable, tool, 'serve', '--socket', sock], stdout=subprocess.PIPE)
+        try:
+            daemon.stdout.readline()  # printed once the socket is listening
+            for name, command in commands.items():
+                median, best = _wall(command, directory, args.runs)
+                print(f"{name:15s} median {median * 1000:7.1f}ms  min {best * 1000:7.1f}ms")
+        finally:
+            daemon.terminate()
+            daemon.wait()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,101 @@
+"""Check that a sharded job survives crashed nodes and resumes to the same output.
+
+Plans a small job and starts ``--nodes`` worker processes on it, each
+acting as a separate node.  Once ``--kill-at`` of the pieces are recorded,
+all of them are killed with SIGKILL, and a torn line is appended to one
+shard's manifest the way a crash during a write would leave it.  The job is
+then resumed with fresh workers.  The check fails unless every piece is
+listed exactly once and matches its checksum, and every piece is
+byte-identical to a clean run on a single worker.  It also fails when the
+kill left no shard in progress, since then there was nothing to recover:
+
+    python -m benchmarks.check_shards --count 3000 --nodes 4 --kill-at 0.25
+"""
+import argparse
+import hashlib
+import multiprocessing
+import os
+import signal
+import sys
+import tempfile
+import time
+
+import engine
+import shards
+
+
+def _node(directory, node):
+    shards.work(directory, node)
+
+
+def crash_and_resume(directory, args):
+    job = shards.Job.plan(directory, args.moods, args.count, args.bars, 0, args.shard_size)
+    context = multiprocessing.get_context('spawn')
+    nodes = [context.Process(target=_node, args=(directory, f"node-{i}")) for i in range(args.nodes)]
+    for process in nodes:
+        process.start()
+    # Kill on progress rather than after a fixed time, so the crash lands mid-job on any machine
+    while (shards.status(directory)['pieces'] < args.kill_at * args.count
+           and any(process.is_alive() for process in nodes)):
+        time.sleep(0.05)
+    for process in nodes:
+        os.kill(process.pid, signal.SIGKILL)
+        process.join()
+    before = shards.status(directory)
+    torn = next((shard for shard in range(job.shards) if not job.is_done(shard) and job.records(shard)), None)
+    if torn is not None:
+        with open(job.shard_path(torn, '.jsonl'), 'ab') as f:
+            f.write(b'{"index": ')
+    print(f"after crash: {before}, torn manifest in shard {torn}")
+    if torn is None:
+        print('warning: no shard had recorded pieces at the kill, so no manifest was torn')
+    # Live locks are refreshed after every piece, so a short limit only breaks the dead ones
+    time.sleep(1.0)
+    start = time.perf_counter()
+    written = shards.work_locally(directory, args.nodes, 'resume', stale_after=1.0)
+    print(f"resumed: wrote {written} more pieces in {time.perf_counter() - start:.1f}s")
+    return before, written
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--moods', nargs='+', default=sorted(engine.moods))
+    parser.add_argument('--count', type=int, default=3000)
+    parser.add_argument('--bars', nargs=2, type=int, default=[8, 32], metavar=('MIN', 'MAX'))
+    parser.add_argument('--shard-size', type=int, default=50)
+    parser.add_argument('--nodes', type=int, default=4)
+    parser.add_argument('--kill-at', type=float, default=0.25, help='fraction of the pieces recorded before the kill')
+    args = parser.parse_args(argv)
+
+    failures = []
+    with tempfile.TemporaryDirectory() as crashed, tempfile.TemporaryDirectory() as clean:
+        before, written = crash_and_resume(crashed, args)
+        recorded = before['pieces']
+        if before['done'] == before['shards'] or not before['claimed']:
+            failures.append('no shard was in progress when the nodes were killed; '
+                            'raise --count or lower --kill-at')
+        shards.Job.plan(clean, args.moods, args.count, args.bars, 0, args.shard_size)
+        shards.work(clean, 'reference')
+
+        records = list(shards.Job(crashed).manifest())
+        reference = {record['index']: record for record in shards.Job(clean).manifest()}
+        if [record['index'] for record in records] != list(range(args.count)):
+            failures.append('manifest does not list every piece exactly once')
+        if recorded + written != args.count:
+            failures.append(f"{recorded} pieces before the crash + {written} after != {args.count}")
+        for record in records:
+            with open(os.path.join(crashed, record['path']), 'rb') as f:
+                if hashlib.sha256(f.read()).hexdigest() != record['sha256']:
+                    failures.append(f"{record['path']} does not match its checksum")
+            if record != reference.get(record['index']):
+                failures.append(f"piece {record['index']} differs from the clean run")
+        if shards.status(crashed)['done'] != shards.Job(crashed).shards:
+            failures.append('not every shard is marked done')
+    for failure in failures[:20]:
+        print(failure)
+    print('ok' if not failures else f"{len(failures)} failures")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,79 @@
+"""Check that streamed generation runs in bounded memory.
+
+Writes a short and a very long piece with ``streaming.write_long_piece``,
+each in a fresh process, and compares their peak RSS.  Each file's chunk
+structure is walked to check that the MTrk lengths add up and every track
+ends with End of Track.  Exits non-zero if the long piece needs more than
+``--max-growth-mb`` beyond the short one:
+
+    python -m benchmarks.check_streaming --bars 1000 100000
+"""
+import argparse
+import multiprocessing
+import os
+import resource
+import struct
+import sys
+import tempfile
+import time
+
+import engine
+import streaming
+import smf_writer
+
+
+def check_chunks(path):
+    """Return the number of MTrk chunks in ``path``; raise ValueError if malformed."""
+    with open(path, 'rb') as f:
+        data = f.read(14)
+        if data[:8] != b'MThd\x00\x00\x00\x06':
+            raise ValueError('bad header chunk')
+        tracks = struct.unpack('>H', data[10:12])[0]
+        for _ in range(tracks):
+            kind, length = struct.unpack('>4sL', f.read(8))
+            if kind != b'MTrk':
+                raise ValueError(f'expected MTrk, got {kind!r}')
+            f.seek(length - len(smf_writer.END_OF_TRACK), os.SEEK_CUR)
+            if f.read(len(smf_writer.END_OF_TRACK)) != smf_writer.END_OF_TRACK:
+                raise ValueError('track does not end with End of Track')
+        if f.read(1):
+            raise ValueError('trailing bytes after the last track')
+    return tracks
+
+
+def stream_piece(mood, bars, directory):
+    path = os.path.join(directory, f"{mood}_{bars}.mid")
+    start = time.perf_counter()
+    streaming.write_long_piece(path, mood, 0, bars)
+    seconds = time.perf_counter() - start
+    return {'mood': mood, 'bars': bars, 'seconds': seconds, 'bytes': os.path.getsize(path),
+            'tracks': check_chunks(path), 'peak_rss_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss}
+
+
+def _isolated(function, *args):
+    with multiprocessing.get_context('spawn').Pool(1, maxtasksperchild=1) as pool:
+        return pool.apply(function, args)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--moods', nargs='+', default=sorted(engine.moods), choices=sorted(engine.moods))
+    parser.add_argument('--bars', nargs=2, type=int, default=[1000, 100000], metavar=('SHORT', 'LONG'))
+    parser.add_argument('--max-growth-mb', type=float, default=16.0)
+    args = parser.parse_args(argv)
+
+    failed = False
+    with tempfile.TemporaryDirectory() as directory:
+        for mood in args.moods:
+            short, long = (_isolated(stream_piece, mood, bars, directory) for bars in args.bars)
+            growth = (long['peak_rss_kb'] - short['peak_rss_kb']) / 1024
+            for result in (short, long):
+                print(f"{mood:10s} {result['bars']:7d} bars  {result['seconds']:7.2f}s  "
+                      f"{result['bytes'] / 1e6:8.1f}MB file  rss {result['peak_rss_kb'] / 1024:6.1f}MB")
+            print(f"{mood:10s} peak RSS growth {growth:+.1f}MB")
+            failed |= growth > args.max_growth_mb
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
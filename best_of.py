@@ -0,0 +1,155 @@
+"""Pick the best of several candidate pieces by a melodic quality score.
+
+Quality varies between seeds.  The register changes and fallback choices in
+the melody sometimes leave big leaps, and the derived harmony lines sometimes
+clash with the melody.  ``best_piece`` composes ``candidates`` pieces from
+seeds derived from the requested seed, scores them all in one vectorized
+pass and returns the highest scoring one.  Each score component is a
+fraction in 0..1, higher is better:
+
+    leaps       main melody steps no wider than a fifth
+    consonance  intervals between each pair of melody, background and
+                second line: 1 for unisons, thirds and sixths, 0.5 for the
+                open fourths and fifths, 0 for seconds, sevenths and the
+                tritone
+    voicing     background and second-line notes that differ from the melody
+                (the harmony maps leave a note unchanged when its target is
+                off the scale, doubling the melody instead of harmonizing it)
+    rhythm      main melody notes that do not repeat the previous pitch
+
+Candidates are composed across a process pool.  Workers send back only the
+pitch arrays the score needs, and only the winner is encoded.  A candidate
+costs about half as much as generating a piece.  With a worker per
+candidate, a best-of-64 takes one candidate plus the winner, about twice
+the time of generating one piece.  ``candidate_seeds`` always starts with the requested
+seed and extends the same list as ``candidates`` grows.  A best-of-N result
+is therefore reproducible, and ``engine.generate(mood, result['seed'])``
+gives the winning piece on its own:
+
+    python best_of.py happy --seed 7 --candidates 64 --workers 8 --out best.mid
+"""
+import argparse
+import os
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+import engine
+import mood_profiles
+import smf_writer
+
+weights = {'leaps': 0.35, 'consonance': 0.3, 'voicing': 0.2, 'rhythm': 0.15}
+
+# Score of each interval in semitones modulo the octave.  The harmony maps keep the
+# lines almost always consonant, so a plain yes/no table scores most pieces the
+# same; the share of open fourths and fifths is what tells them apart.
+consonance = np.zeros(12)
+consonance[[0, 3, 4, 8, 9]] = 1.0
+consonance[[5, 7]] = 0.5
+
+max_step = 7
+
+
+def candidate_seeds(seed, count):
+    """Return ``count`` seeds: ``seed`` itself followed by seeds drawn from it."""
+    rng = random.Random(f"candidates:{seed}")
+    return [seed] + [rng.getrandbits(63) for _ in range(count - 1)]
+
+
+def _track_pitches(events, channel):
+    on = (events[:, 1] == (0x90 | channel)) & (events[:, 3] > 0)
+    return events[on, 2]
+
+
+def candidate_features(mood, seed, bars=16):
+    """Compose one candidate and return what ``score_candidates`` needs from it.
+
+    Returns ``(main, background, second)``, the pitches of the three melodic
+    lines.
+    """
+    tracks, _ = engine.compose_events(mood, seed, bars)
+    lines = dict(zip(mood_profiles.track_names, tracks))
+    return tuple(_track_pitches(lines[name], mood_profiles.channels[name])
+                 for name in ('main', 'background', 'second'))
+
+
+def _features_batch(jobs):
+    # One task per worker, so each candidate costs no IPC round trip of its own
+    return [candidate_features(*job) for job in jobs]
+
+
+def score_candidates(main, background, second):
+    """Score stacked candidates; arguments are ``(candidates, notes)`` arrays.
+
+    Returns ``(scores, components)`` with ``components`` mapping each name in
+    ``weights`` to a ``(candidates,)`` array.
+    """
+    main, background, second = (np.asarray(line, dtype=np.int64) for line in (main, background, second))
+    steps = np.diff(main, axis=1)
+    harmony = np.stack([background, second])
+    components = {
+        'leaps': (np.abs(steps) <= max_step).mean(axis=1),
+        'consonance': consonance[(np.stack([background - main, second - main, second - background]) % 12)]
+                      .mean(axis=(0, 2)),
+        'voicing': (harmony != main[None]).mean(axis=(0, 2)),
+        'rhythm': (steps != 0).mean(axis=1),
+    }
+    scores = sum(weights[name] * values for name, values in components.items())
+    return scores, components
+
+
+def best_piece(mood, seed, bars=16, candidates=64, executor=None, workers=1):
+    """Return ``(data, result)`` for the best of ``candidates`` pieces of ``mood``.
+
+    ``result`` holds the winner's ``seed``, ``choices``, ``score`` and score
+    ``components``, and the ``scores`` of every candidate in seed order.
+    Candidates are composed in ``executor`` split into ``workers`` tasks, or
+    in this process when ``executor`` is None.
+    """
+    seeds = candidate_seeds(seed, candidates)
+    jobs = [(mood, candidate, bars) for candidate in seeds]
+    if executor is None:
+        features = _features_batch(jobs)
+    else:
+        size = -(-len(jobs) // workers)
+        features = [f for batch in executor.map(_features_batch, [jobs[i:i + size] for i in range(0, len(jobs), size)])
+                    for f in batch]
+    scores, components = score_candidates(*(np.stack(column) for column in zip(*features)))
+    best = int(np.argmax(scores))
+    tracks, choices = engine.compose_events(mood, seeds[best], bars)
+    data = smf_writer.encode_file(tracks, engine.mood_module(mood).tempo)
+    result = {'seed': seeds[best], 'choices': choices, 'score': float(scores[best]),
+              'components': {name: float(values[best]) for name, values in components.items()},
+              'scores': scores.tolist()}
+    return data, result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('mood', choices=sorted(engine.moods))
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--bars', type=int, default=16)
+    parser.add_argument('--candidates', type=int, default=64)
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--out', default=None)
+    args = parser.parse_args(argv)
+
+    workers = args.workers or os.cpu_count() or 1
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        start = time.perf_counter()
+        data, result = best_piece(args.mood, args.seed, args.bars, args.candidates, executor, workers)
+        seconds = time.perf_counter() - start
+    out = args.out or f"{args.mood}_{result['seed']}.mid"
+    with open(out, 'wb') as f:
+        f.write(data)
+    scores = np.array(result['scores'])
+    print(f"best of {args.candidates}: seed {result['seed']} score {result['score']:.3f} "
+          f"(median {np.median(scores):.3f}, requested seed {scores[0]:.3f}) in {seconds * 1000:.0f}ms")
+    print(', '.join(f"{name}: {value:.3f}" for name, value in result['components'].items()))
+    print(f"Saved {out}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,154 @@
+"""Content-addressed on-disk cache of generated pieces.
+
+Every output is stored under a key hashed from what determines it: the
+output kind, mood, seed, generation parameters, ``engine.generator_version``
+and a hash of the mood's profile settings, so editing a profile stops old
+pieces of that mood from being served.
+Asking for the same piece again reads the stored file instead of
+regenerating it.
+
+The cache is bounded by total size.  Hits refresh a file's modification
+time, and when the cache grows past ``max_bytes`` the least recently used
+files are deleted until it is back under ``low_water`` of the limit.  Files
+are written to a temporary name and renamed into place, so several
+processes can share one cache directory.
+"""
+import hashlib
+import json
+import os
+import tempfile
+
+import engine
+import render
+
+
+def cache_key(kind, mood, seed, **params):
+    """Return the hex key of one output; ``params`` must be JSON-serializable."""
+    description = {'kind': kind, 'mood': mood, 'seed': seed, 'params': params,
+                   'version': engine.generator_version, 'profile': engine.mood_module(mood).settings_hash}
+    return hashlib.sha256(json.dumps(description, sort_keys=True).encode()).hexdigest()
+
+
+class PieceCache:
+    """Size-bounded LRU cache of MIDI and WAV outputs in ``directory``."""
+
+    def __init__(self, directory, max_bytes=1 << 30, low_water=0.9):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.low_water = low_water
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        os.makedirs(directory, exist_ok=True)
+        self.size = sum(size for _, size, _ in self._entries())
+
+    def path(self, key, suffix):
+        # Two-level fan-out keeps directories small for large caches
+        return os.path.join(self.directory, key[:2], key + suffix)
+
+    def _entries(self):
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                if name.startswith('.tmp'):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue  # evicted by another process
+                yield path, stat.st_size, stat.st_mtime
+
+    def lookup(self, key, suffix):
+        """Return the path of a cached output and mark it used, or None."""
+        path = self.path(key, suffix)
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return path
+
+    def store(self, key, suffix, write):
+        """Create a cached output by calling ``write(temp_path)``; return its final path."""
+        path = self.path(key, suffix)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(prefix='.tmp', suffix=suffix, dir=os.path.dirname(path))
+        os.close(fd)
+        try:
+            write(temp_path)
+            os.replace(temp_path, path)
+        except BaseException:
+            os.remove(temp_path)
+            raise
+        self.size += os.path.getsize(path)
+        if self.size > self.max_bytes:
+            self.evict(keep=path)
+        return path
+
+    def evict(self, keep=None):
+        """Delete least recently used files until under ``low_water * max_bytes``.
+
+        ``keep`` (the file just stored) is never deleted, even if it alone
+        is larger than the limit.
+        """
+        entries = sorted(self._entries(), key=lambda entry: entry[2])
+        self.size = sum(size for _, size, _ in entries)
+        target = self.max_bytes * self.low_water
+        for path, size, _ in entries:
+            if self.size <= target:
+                break
+            if path == keep:
+                continue
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            self.size -= size
+            self.evictions += 1
+
+    def midi_path(self, mood, seed, bars=16):
+        """Return the path of the cached .mid for a piece, generating it on a miss."""
+        path = self.lookup(cache_key('mid', mood, seed, bars=bars), '.mid')
+        if path is None:
+            path = self.store_midi(mood, seed, bars, engine.generate_bytes(mood, seed, bars))
+        return path
+
+    def cached_midi(self, mood, seed, bars=16):
+        """Return the cached .mid bytes of a piece and mark them used, or None on a miss."""
+        path = self.lookup(cache_key('mid', mood, seed, bars=bars), '.mid')
+        if path is None:
+            return None
+        try:
+            with open(path, 'rb') as f:
+                return f.read()
+        except FileNotFoundError:
+            return None  # evicted by another process between lookup and read
+
+    def store_midi(self, mood, seed, bars, data):
+        """Store .mid bytes generated elsewhere for a piece; return the cached path."""
+        def write(temp_path):
+            with open(temp_path, 'wb') as f:
+                f.write(data)
+
+        return self.store(cache_key('mid', mood, seed, bars=bars), '.mid', write)
+
+    def midi(self, mood, seed, bars=16):
+        """Return the .mid bytes of a piece, from the cache when possible."""
+        data = self.cached_midi(mood, seed, bars)
+        if data is None:
+            data = engine.generate_bytes(mood, seed, bars)
+            self.store_midi(mood, seed, bars, data)
+        return data
+
+    def wav_path(self, mood, seed, bars=16, sample_rate=44100):
+        """Return the path of the cached rendered .wav for a piece, rendering it on a miss."""
+        key = cache_key('wav', mood, seed, bars=bars, sample_rate=sample_rate)
+        path = self.lookup(key, '.wav')
+        if path is None:
+            path = self.store(key, '.wav', lambda temp_path: render.render_piece(
+                mood, seed, temp_path, bars, sample_rate=sample_rate))
+        return path
+
+    def stats(self):
+        return {'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions, 'bytes': self.size}
@@ -0,0 +1,244 @@
+"""Near-duplicate detection for generated melodies.
+
+A melody is reduced to the set of its interval n-grams (the steps between
+consecutive notes, so a transposed copy has the same set), sketched with
+MinHash, and indexed with locality-sensitive hashing: the signature is cut
+into bands and two melodies become candidates when any band matches
+exactly.  Only candidates are compared, so checking a melody against
+millions of others touches a handful of them.  A candidate counts as a
+duplicate when the fraction of equal signature entries, an estimate of the
+n-gram Jaccard similarity, reaches ``threshold``.
+
+Used inline by ``batch.py --dedup`` (duplicates are regenerated with
+another seed) and offline over a directory of .mid files:
+
+    python dedup.py catalog --index catalog.lsh
+"""
+import argparse
+import os
+
+import numpy as np
+
+import library_index
+
+ngram = 5
+_mersenne = np.uint64((1 << 61) - 1)
+
+
+def interval_shingles(melody, n=ngram):
+    """Return the distinct interval n-grams of ``melody`` as uint64 codes."""
+    intervals = np.clip(np.diff(np.asarray(melody, dtype=np.int64)), -63, 63) + 64
+    if len(intervals) < n:
+        return np.unique(intervals.astype(np.uint64))
+    codes = np.zeros(len(intervals) - n + 1, dtype=np.uint64)
+    for k in range(n):
+        codes = (codes << np.uint64(7)) | intervals[k:len(intervals) - n + 1 + k].astype(np.uint64)
+    return np.unique(codes)
+
+
+def _mix(values):
+    # splitmix64 finalizer, spreads n-gram codes over all 64 bits
+    values = values ^ (values >> np.uint64(30))
+    values = values * np.uint64(0xBF58476D1CE4E5B9)
+    values = values ^ (values >> np.uint64(27))
+    values = values * np.uint64(0x94D049BB133111EB)
+    return values ^ (values >> np.uint64(31))
+
+
+class MinHasher:
+    """``num_perm`` universal hash functions over 32-bit shingle hashes."""
+
+    def __init__(self, num_perm=64, seed=1):
+        rng = np.random.default_rng(seed)
+        self.num_perm = num_perm
+        self.a = rng.integers(1, int(_mersenne), size=num_perm, dtype=np.uint64)
+        self.b = rng.integers(0, int(_mersenne), size=num_perm, dtype=np.uint64)
+
+    def signature(self, shingles):
+        """Return the ``(num_perm,)`` uint32 MinHash signature of a set of shingle codes."""
+        if not len(shingles):
+            return np.full(self.num_perm, 0xFFFFFFFF, dtype=np.uint32)
+        hashed = _mix(np.asarray(shingles, dtype=np.uint64)) & np.uint64(0xFFFFFFFF)
+        with np.errstate(over='ignore'):
+            values = (self.a[:, None] * hashed[None, :] + self.b[:, None]) % _mersenne
+        return (values & np.uint64(0xFFFFFFFF)).min(axis=1).astype(np.uint32)
+
+    def melody_signature(self, melody, n=ngram):
+        return self.signature(interval_shingles(melody, n))
+
+
+def melody_from_events(events, channel=0):
+    """Return the note_on pitches of ``channel`` in an event array, in order."""
+    on = (events[:, 1] == (0x90 | channel)) & (events[:, 3] > 0)
+    return events[on, 2]
+
+
+class MelodyLSH:
+    """LSH index of MinHash signatures, each with a string label (a path or piece name).
+
+    ``bands * rows == num_perm``.  With the defaults (16 bands of 4) a
+    piece with similarity 0.6 becomes a candidate with probability 0.9 and
+    one with 0.8 almost surely, while unrelated generated melodies, whose
+    similarity stays below 0.05, essentially never do.
+    """
+
+    def __init__(self, num_perm=64, bands=16, threshold=0.6, seed=1):
+        if num_perm % bands:
+            raise ValueError('num_perm must be a multiple of bands')
+        self.hasher = MinHasher(num_perm, seed)
+        self.seed = seed
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.threshold = threshold
+        self.rejected = 0
+        self.labels = []
+        self._signatures = np.zeros((1024, num_perm), dtype=np.uint32)
+        self._keys = np.zeros((1024, bands), dtype=np.uint64)
+        # Per band, the row order that sorts the first `_merged` keys; later rows are
+        # found through one dict per band, mapping a key to its rows
+        self._order = np.zeros((bands, 0), dtype=np.int64)
+        self._sorted = np.zeros((bands, 0), dtype=np.uint64)
+        self._merged = 0
+        self._tail = [{} for _ in range(bands)]
+
+    def __len__(self):
+        return len(self.labels)
+
+    @property
+    def signatures(self):
+        return self._signatures[:len(self.labels)]
+
+    def _band_keys(self, signatures):
+        # One 64-bit key per band from its `rows` signature entries
+        parts = signatures.reshape(len(signatures), self.bands, self.rows).astype(np.uint64)
+        keys = np.zeros(parts.shape[:2], dtype=np.uint64)
+        with np.errstate(over='ignore'):
+            for j in range(self.rows):
+                keys = _mix(keys ^ parts[:, :, j])
+        return keys
+
+    def add(self, label, signature):
+        self.add_many([label], np.asarray(signature)[None])
+
+    def add_many(self, labels, signatures):
+        count, new = len(self.labels), len(labels)
+        if count + new > len(self._signatures):
+            capacity = max(2 * len(self._signatures), count + new)
+            self._signatures = np.resize(self._signatures, (capacity, self._signatures.shape[1]))
+            self._keys = np.resize(self._keys, (capacity, self.bands))
+        self._signatures[count:count + new] = signatures
+        self._keys[count:count + new] = self._band_keys(np.asarray(signatures))
+        self.labels.extend(labels)
+        # Re-sort once the tail is large relative to the sorted part, so merges cost O(log n) per row
+        if len(self.labels) - self._merged > max(4096, self._merged // 4):
+            self._merge()
+            return
+        for row, keys in enumerate(self._keys[count:count + new].tolist(), start=count):
+            for tail, key in zip(self._tail, keys):
+                tail.setdefault(key, []).append(row)
+
+    def _merge(self):
+        keys = self._keys[:len(self.labels)].T
+        self._order = np.argsort(keys, axis=1, kind='stable')
+        self._sorted = np.take_along_axis(keys, self._order, axis=1)
+        self._merged = len(self.labels)
+        self._tail = [{} for _ in range(self.bands)]
+
+    def candidates(self, signature):
+        """Return the rows sharing at least one band key with ``signature``."""
+        keys = self._band_keys(np.asarray(signature)[None])[0]
+        found = [np.zeros(0, dtype=np.int64)]
+        for band, key in enumerate(keys):
+            lo = np.searchsorted(self._sorted[band], key, side='left')
+            hi = np.searchsorted(self._sorted[band], key, side='right')
+            if hi > lo:
+                found.append(self._order[band, lo:hi])
+            rows = self._tail[band].get(int(key))
+            if rows:
+                found.append(np.array(rows, dtype=np.int64))
+        return np.unique(np.concatenate(found))
+
+    def query(self, signature):
+        """Return ``[(label, similarity)]`` of indexed pieces at or above ``threshold``, most similar first."""
+        rows = self.candidates(signature)
+        if not len(rows):
+            return []
+        similarity = (self._signatures[rows] == signature).mean(axis=1)
+        keep = np.flatnonzero(similarity >= self.threshold)
+        keep = keep[np.argsort(-similarity[keep], kind='stable')]
+        return [(self.labels[rows[k]], float(similarity[k])) for k in keep]
+
+    def add_if_unique(self, label, signature):
+        """Index ``signature`` unless it duplicates an indexed piece; return the duplicates found."""
+        duplicates = self.query(signature)
+        if duplicates:
+            self.rejected += 1
+        else:
+            self.add(label, signature)
+        return duplicates
+
+    def save(self, path):
+        with open(path, 'wb') as f:
+            np.savez(f, signatures=self.signatures, labels=np.array(self.labels, dtype=str),
+                     params=np.array([self.hasher.num_perm, self.bands, self.seed]), threshold=self.threshold)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            num_perm, bands, seed = (int(v) for v in data['params'])
+            index = cls(num_perm, bands, float(data['threshold']), seed)
+            if len(data['labels']):
+                index.add_many(data['labels'].tolist(), data['signatures'])
+                index._merge()
+        return index
+
+
+def file_melody(path):
+    """Return the main melody of a .mid file: the note_ons of its first melodic track."""
+    features = library_index.parse_file(path, melody=True)
+    return None if features is None else features['melody']
+
+
+def scan_directory(directory, index):
+    """Check every .mid file under ``directory`` against ``index``, adding the unique ones.
+
+    Files are visited in sorted order, so of two near-identical files the
+    first one is kept.  Files already in the index are skipped.  Returns
+    ``[(path, duplicate_of, similarity)]``.
+    """
+    duplicates = []
+    indexed = set(index.labels)
+    for path, _, _ in sorted(library_index.scan_library(directory)):
+        full = os.path.join(directory, path)
+        if full in indexed:
+            continue
+        melody = file_melody(full)
+        if melody is None or len(melody) < 2:
+            continue
+        found = index.add_if_unique(full, index.hasher.melody_signature(melody))
+        if found:
+            duplicates.append((full, *found[0]))
+    return duplicates
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('directory')
+    parser.add_argument('--index', default=None, help='LSH index (.npz) to check against and extend')
+    parser.add_argument('--threshold', type=float, default=0.6)
+    args = parser.parse_args(argv)
+
+    if args.index and os.path.exists(args.index):
+        index = MelodyLSH.load(args.index)
+    else:
+        index = MelodyLSH(threshold=args.threshold)
+    duplicates = scan_directory(args.directory, index)
+    for path, original, similarity in duplicates:
+        print(f"{path}\t{original}\t{similarity:.2f}")
+    print(f"{len(duplicates)} near-duplicates, {len(index)} unique melodies indexed")
+    if args.index:
+        index.save(args.index)
+
+
+if __name__ == '__main__':
+    main()
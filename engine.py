@@ -0,0 +1,67 @@
+"""Importable entry point for the mood generators.
+
+Every profile in ``profiles/`` is compiled once when this module is
+imported; ``moods`` maps each mood name to its ``MoodProfile``, which is
+driven from a seeded ``random.Random`` so one process can serve pieces of
+any mood.
+"""
+import random
+
+import numpy as np
+
+import fast_melody
+import instrumentation
+import mood_profiles
+import smf_writer
+
+moods = {name: mood_profiles.profile(name) for name in mood_profiles.available()}
+
+# Bump whenever the same (mood, seed, bars) would produce different output,
+# so cached pieces from older versions are not served
+generator_version = 1
+
+
+def mood_module(mood):
+    try:
+        return moods[mood]
+    except KeyError:
+        raise ValueError(f"unknown mood {mood!r}, expected one of {sorted(moods)}") from None
+
+
+def compose_events(mood, seed, bars=16):
+    """Return ``(tracks, choices)`` for one piece, with tracks as event arrays."""
+    return mood_module(mood).compose_events(random.Random(seed), bars)
+
+
+def compose(mood, seed, bars=16):
+    """Return ``(mid, choices)`` for one piece of ``mood``."""
+    return mood_module(mood).build_midi(random.Random(seed), bars)
+
+
+def generate(mood, seed, bars=16):
+    """Return one piece of ``mood`` as a ``mido.MidiFile``."""
+    mid, _ = compose(mood, seed, bars)
+    return mid
+
+
+def generate_bytes(mood, seed, bars=16):
+    """Return one piece of ``mood`` as Standard MIDI File bytes.
+
+    Written by ``smf_writer`` straight from the event arrays; the bytes are
+    the same as saving ``generate(mood, seed, bars)`` with mido.
+    """
+    tracks, _ = compose_events(mood, seed, bars)
+    with instrumentation.stage('encode'):
+        return smf_writer.encode_file(tracks, mood_module(mood).tempo)
+
+
+def generate_melodies(mood, count, seed, bars=16):
+    """Return a ``(count, bars * 8)`` array of main melodies for ``mood``.
+
+    Uses the vectorized backend, so the melodies follow the same rules as
+    the profile's ``generate_register_changing_melody`` but are not the same
+    notes that ``generate(mood, seed)`` would pick.
+    """
+    module = mood_module(mood)
+    melodies, _ = fast_melody.mood_melodies(module, count, bars * module.notes_per_bar, np.random.default_rng(seed))
+    return melodies
@@ -0,0 +1,131 @@
+"""Vectorized counterpart of ``generate_register_changing_melody``.
+
+The pure-Python generators pick one note at a time.  Here every step of the
+melody is taken for thousands of melodies at once: the scale is compiled into
+small neighbour tables (which register notes lie within ``max_interval`` of a
+given note, and which passing tones exist) and each step becomes a handful of
+array lookups driven by a seeded ``numpy.random.Generator``.
+
+The sampling rules match the scripts:
+
+* every ``segment_size`` steps the melody moves to one of the two other
+  registers, chosen uniformly;
+* Happy/energetic style: the first note of a segment is uniform over the
+  register, later ones uniform over the register notes within
+  ``max_interval`` of the previous note, and with ``passing_prob`` a
+  neighbouring semitone is inserted before the note if it is in the register;
+* Moody style (``resample_leaps=True``): each note is uniform over the
+  register and is redrawn from the notes within ``max_interval`` of the
+  previous note (in any register) only when the leap is too large.
+"""
+import numpy as np
+
+# Offsets of the low, middle and high registers relative to the scale
+register_offsets = np.array([-12, 0, 12])
+
+
+def _pitch_table(scale):
+    # Pitch of every (register, scale index) state, flattened to 3 * len(scale)
+    scale = np.asarray(scale)
+    return (register_offsets[:, None] + scale[None, :]).ravel()
+
+
+def _neighbour_tables(scale, max_interval):
+    """Return ``(counts, choices)`` for picking a close note in each register.
+
+    ``counts[r, s]`` is how many notes of register ``r`` lie within
+    ``max_interval`` of state ``s``; ``choices[r, s, :counts[r, s]]`` are their
+    scale indices.
+    """
+    pitches = _pitch_table(scale)
+    size = len(scale)
+    register_pitches = pitches.reshape(3, size)
+    close = np.abs(register_pitches[:, None, :] - pitches[None, :, None]) <= max_interval
+    counts = close.sum(axis=2)
+    # Stable sort puts the in-range indices first, in scale order
+    choices = np.argsort(~close, axis=2, kind='stable')
+    return counts, choices
+
+
+def _passing_table(scale):
+    # passing[j, d] is the scale index of scale[j] - 1 (d=0) or + 1 (d=1), or -1
+    scale = list(scale)
+    passing = np.full((len(scale), 2), -1)
+    for j, note in enumerate(scale):
+        for d, step in enumerate((-1, 1)):
+            if note + step in scale:
+                passing[j, d] = scale.index(note + step)
+    return passing
+
+
+def generate_melodies(rng, count, length, scale, max_interval, passing_prob=0.0,
+                      segment_size=6, resample_leaps=False):
+    """Return a ``(count, length)`` array of register-changing melodies."""
+    size = len(scale)
+    pitches = _pitch_table(scale)
+    counts, choices = _neighbour_tables(scale, max_interval)
+    passing = _passing_table(scale)
+
+    # One spare column: a passing tone plus its note may overshoot by one
+    out = np.zeros((count, length + 1), dtype=np.int16)
+    written = np.zeros(count, dtype=np.intp)
+    rows = np.arange(count)
+
+    register = rng.integers(3, size=count)
+    state = np.zeros(count, dtype=np.intp)
+    total_segments = length // segment_size + (1 if length % segment_size else 0)
+
+    for seg in range(total_segments):
+        # Move to one of the two other registers
+        register = (register + 1 + rng.integers(2, size=count)) % 3
+        for i in range(segment_size):
+            active = written < length
+            if not active.any():
+                break
+            index = rng.integers(size, size=count)
+            started = written > 0
+
+            if resample_leaps:
+                leap = np.abs(pitches[register * size + index] - pitches[state]) > max_interval
+                n_close = counts[register, state]
+                redraw = started & leap & (n_close > 0)
+                pick = (rng.random(count) * n_close).astype(np.intp)
+                index = np.where(redraw, choices[register, state, np.minimum(pick, size - 1)], index)
+            elif i > 0:
+                n_close = counts[register, state]
+                pick = (rng.random(count) * n_close).astype(np.intp)
+                index = choices[register, state, pick]
+
+            if passing_prob:
+                direction = (rng.random(count) < 0.5).astype(np.intp)
+                tone = passing[index, direction]
+                insert = active & started & (rng.random(count) < passing_prob) & (tone >= 0)
+                out[rows[insert], written[insert]] = pitches[register[insert] * size + tone[insert]]
+                written += insert
+
+            state = register * size + index
+            out[rows[active], written[active]] = pitches[state[active]]
+            written += active
+
+    return out[:, :length]
+
+
+def mood_melodies(module, count, length, rng, segment_size=6):
+    """Vectorized ``module.generate_register_changing_melody`` for ``count`` pieces.
+
+    ``module`` is a ``mood_profiles.MoodProfile``.  Returns ``(melodies,
+    scale_ids)``; ``scale_ids`` indexes ``module.scales`` (all zeros for
+    moods with a single scale).
+    """
+    scales = list(module.scales.values())
+    scale_ids = rng.integers(len(scales), size=count)
+    melodies = np.empty((count, length), dtype=np.int16)
+    for k, scale in enumerate(scales):
+        rows = np.flatnonzero(scale_ids == k)
+        if len(rows):
+            melodies[rows] = generate_melodies(
+                rng, len(rows), length, scale, module.max_interval,
+                passing_prob=module.passing_tone_prob,
+                segment_size=segment_size,
+                resample_leaps=module.resample_leaps)
+    return melodies, scale_ids
@@ -0,0 +1,457 @@
+"""Feature index over a library of .mid files.
+
+Finding pieces by key, tempo, instrument or pitch range used to mean opening
+every file with ``mido.MidiFile``.  The indexer instead reads each file
+through ``mmap`` with a small SMF parser that only decodes what the features
+need, and stores one row per file in columnar NumPy arrays:
+
+* tempo (first ``set_tempo``) and bpm, duration in seconds, track count;
+* the programs used on melodic channels, as a 128-bit mask;
+* a 128-bin pitch histogram of the melodic notes, their count, lowest and
+  highest pitch and notes per second;
+* the key estimated from the pitch-class histogram (Krumhansl-Schmuckler).
+
+The columns are ``.npy`` files loaded with ``mmap_mode='r'``, so opening the
+index is cheap and a query is a few vectorized comparisons.  ``update``
+re-parses only files whose size or modification time changed, drops rows of
+deleted files and writes the new columns as a fresh generation directory,
+switching to it with an atomic rename of the ``current`` pointer file.
+The previous generation is removed only by the update after, so a reader
+that has just read the pointer can still load the columns it names:
+
+    python library_index.py update catalog --index catalog.idx
+    python library_index.py query --index catalog.idx --bpm 100 120 --key "C major" --program 5
+"""
+import argparse
+import json
+import mmap
+import os
+import shutil
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+index_version = 1
+percussion_channel = 9
+
+note_names = ['C', 'C#', 'D', 'D#', 'E', 'F', 'F#', 'G', 'G#', 'A', 'A#', 'B']
+key_names = [f"{name} major" for name in note_names] + [f"{name} minor" for name in note_names]
+
+# Krumhansl-Kessler key profiles, rotated to every tonic: (24 keys, 12 pitch classes)
+_major_profile = np.array([6.35, 2.23, 3.48, 2.33, 4.38, 4.09, 2.52, 5.19, 2.39, 3.66, 2.29, 2.88])
+_minor_profile = np.array([6.33, 2.68, 3.52, 5.38, 2.60, 3.53, 2.54, 4.75, 3.98, 2.69, 3.34, 3.17])
+_key_profiles = np.array([np.roll(profile, tonic) for profile in (_major_profile, _minor_profile) for tonic in range(12)])
+
+
+def estimate_keys(histograms):
+    """Return the best-correlated key index (see ``key_names``) per row of 128-bin histograms, -1 if empty."""
+    histograms = np.atleast_2d(histograms)
+    pitch_classes = np.zeros((len(histograms), 12))
+    for pc in range(12):
+        pitch_classes[:, pc] = histograms[:, pc::12].sum(axis=1)
+    centered = pitch_classes - pitch_classes.mean(axis=1, keepdims=True)
+    profiles = _key_profiles - _key_profiles.mean(axis=1, keepdims=True)
+    norms = np.linalg.norm(centered, axis=1, keepdims=True) * np.linalg.norm(profiles, axis=1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        correlation = centered @ profiles.T / norms
+    keys = np.argmax(np.nan_to_num(correlation, nan=-2.0), axis=1)
+    keys[pitch_classes.sum(axis=1) == 0] = -1
+    return keys
+
+
+def parse_smf(data, melody=False):
+    """Extract the features of one Standard MIDI File from a bytes-like object.
+
+    With ``melody``, the features also hold the pitches of the note_ons of
+    the first track with melodic notes, in order.  Raises ValueError for
+    data that is not a well-formed SMF.
+    """
+    try:
+        return _parse_smf(data, melody)
+    except IndexError:
+        raise ValueError('truncated track') from None
+
+
+def _parse_smf(data, melody=False):
+    size = len(data)
+    if size < 14 or data[:4] != b'MThd':
+        raise ValueError('not a Standard MIDI File')
+    header_length = int.from_bytes(data[4:8], 'big')
+    division = int.from_bytes(data[12:14], 'big')
+    histogram = [0] * 128
+    programs = set()
+    tempos = []
+    end_tick = 0
+    tracks = 0
+    melody_notes = []
+    melody_track = None if melody else -1
+
+    pos = 8 + header_length
+    while pos + 8 <= size:
+        length = int.from_bytes(data[pos + 4:pos + 8], 'big')
+        i, end = pos + 8, min(pos + 8 + length, size)
+        if data[pos:pos + 4] != b'MTrk':
+            pos = end
+            continue
+        tracks += 1
+        tick = 0
+        status = 0
+        while i < end:
+            # Delta time as a variable-length quantity
+            byte = data[i]
+            i += 1
+            delta = byte & 0x7F
+            while byte & 0x80:
+                byte = data[i]
+                i += 1
+                delta = (delta << 7) | (byte & 0x7F)
+            tick += delta
+
+            byte = data[i]
+            if byte == 0xFF:
+                kind = data[i + 1]
+                i += 2
+                byte = data[i]
+                i += 1
+                meta_length = byte & 0x7F
+                while byte & 0x80:
+                    byte = data[i]
+                    i += 1
+                    meta_length = (meta_length << 7) | (byte & 0x7F)
+                if kind == 0x51 and meta_length == 3:
+                    tempos.append((tick, int.from_bytes(data[i:i + 3], 'big')))
+                elif kind == 0x2F:
+                    i += meta_length
+                    break
+                i += meta_length
+                continue
+            if byte == 0xF0 or byte == 0xF7:
+                i += 1
+                byte = data[i]
+                i += 1
+                sysex_length = byte & 0x7F
+                while byte & 0x80:
+                    byte = data[i]
+                    i += 1
+                    sysex_length = (sysex_length << 7) | (byte & 0x7F)
+                i += sysex_length
+                continue
+            if byte & 0x80:
+                status = byte
+                i += 1
+            elif not status:
+                raise ValueError('running status without a previous status byte')
+
+            kind = status & 0xF0
+            if kind == 0xC0 or kind == 0xD0:
+                if kind == 0xC0 and status & 0x0F != percussion_channel:
+                    programs.add(data[i])
+                i += 1
+            else:
+                if kind == 0x90 and data[i + 1] and status & 0x0F != percussion_channel:
+                    histogram[data[i]] += 1
+                    if melody_track is None:
+                        melody_track = tracks
+                    if melody_track == tracks:
+                        melody_notes.append(data[i])
+                i += 2
+        end_tick = max(end_tick, tick)
+        pos = pos + 8 + length
+
+    tempos.sort()
+    features = {'tracks': tracks, 'tempo': tempos[0][1] if tempos else 500000,
+                'duration': _seconds(end_tick, tempos, division),
+                'programs': sorted(programs), 'histogram': histogram}
+    if melody:
+        features['melody'] = melody_notes
+    return features
+
+
+def _seconds(ticks, tempos, division):
+    if division & 0x8000:
+        # SMPTE timing: frames per second times ticks per frame
+        frames = 256 - (division >> 8)
+        return ticks / (frames * (division & 0xFF))
+    seconds, last_tick, tempo = 0.0, 0, 500000
+    for tick, new_tempo in tempos:
+        if tick >= ticks:
+            break
+        seconds += (tick - last_tick) * tempo / 1e6 / division
+        last_tick, tempo = tick, new_tempo
+    return seconds + (ticks - last_tick) * tempo / 1e6 / division
+
+
+def parse_file(path, melody=False):
+    """Return the features of the .mid file at ``path``, or None if it cannot be parsed."""
+    try:
+        with open(path, 'rb') as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                return None
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                return parse_smf(data, melody)
+    except (OSError, ValueError):
+        return None
+
+
+def _parse_many(paths):
+    return [parse_file(path) for path in paths]
+
+
+def scan_library(root):
+    """Yield ``(relative path, size, mtime_ns)`` of every .mid file under ``root``."""
+    pending = [root]
+    while pending:
+        with os.scandir(pending.pop()) as entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    pending.append(entry.path)
+                elif entry.name.lower().endswith(('.mid', '.midi')):
+                    stat = entry.stat()
+                    yield os.path.relpath(entry.path, root), stat.st_size, stat.st_mtime_ns
+
+
+# Column name -> (dtype, shape of one row)
+columns = {
+    'path': (None, ()),
+    'size': (np.int64, ()),
+    'mtime_ns': (np.int64, ()),
+    'ok': (np.bool_, ()),
+    'tracks': (np.int16, ()),
+    'tempo': (np.int32, ()),
+    'bpm': (np.float32, ()),
+    'duration': (np.float32, ()),
+    'notes': (np.int32, ()),
+    'density': (np.float32, ()),
+    'pitch_min': (np.int16, ()),
+    'pitch_max': (np.int16, ()),
+    'key': (np.int8, ()),
+    'programs': (np.uint64, (2,)),
+    'histogram': (np.uint32, (128,)),
+}
+
+
+def _rows(files, features):
+    """Build the column arrays of newly parsed files."""
+    count = len(files)
+    out = {name: np.zeros((count,) + shape, dtype=dtype) for name, (dtype, shape) in columns.items() if dtype}
+    out['path'] = np.array([path for path, _, _ in files], dtype=str)
+    out['size'][:] = [size for _, size, _ in files]
+    out['mtime_ns'][:] = [mtime for _, _, mtime in files]
+    for row, feature in enumerate(features):
+        if feature is None:
+            continue
+        out['ok'][row] = True
+        out['tracks'][row] = feature['tracks']
+        out['tempo'][row] = feature['tempo']
+        out['duration'][row] = feature['duration']
+        out['histogram'][row] = feature['histogram']
+        for program in feature['programs']:
+            out['programs'][row, program // 64] |= np.uint64(1) << np.uint64(program % 64)
+    out['bpm'] = np.where(out['tempo'] > 0, 60e6 / np.maximum(out['tempo'], 1), 0).astype(np.float32)
+    out['notes'][:] = out['histogram'].sum(axis=1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        out['density'] = np.where(out['duration'] > 0, out['notes'] / out['duration'], 0).astype(np.float32)
+    played = out['histogram'] > 0
+    out['pitch_min'] = np.where(played.any(axis=1), played.argmax(axis=1), -1).astype(np.int16)
+    out['pitch_max'] = np.where(played.any(axis=1), 127 - played[:, ::-1].argmax(axis=1), -1).astype(np.int16)
+    out['key'] = estimate_keys(out['histogram']).astype(np.int8)
+    return out
+
+
+class LibraryIndex:
+    """Columnar feature index of the .mid files under one library directory."""
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.root = None
+        self.columns = {}
+        self._load()
+
+    def _load(self, attempts=3):
+        for _ in range(attempts):
+            try:
+                with open(os.path.join(self.directory, 'current')) as f:
+                    generation = os.path.join(self.directory, f.read().strip())
+                with open(os.path.join(generation, 'meta.json')) as f:
+                    meta = json.load(f)
+                if meta.get('version') != index_version:
+                    return  # built by another version: rebuilt on the next update
+                loaded = {name: np.load(os.path.join(generation, name + '.npy'), mmap_mode='r')
+                          for name in columns}
+            except FileNotFoundError:
+                # No index yet, or two updates removed the generation read; the pointer has moved on
+                continue
+            self.root = meta['root']
+            self.columns = loaded
+            return
+
+    def __len__(self):
+        return len(self.columns['path']) if self.columns else 0
+
+    def update(self, root, workers=None):
+        """Bring the index up to date with ``root``; return counts of what changed."""
+        root = os.path.abspath(root)
+        started = time.perf_counter()
+        found = sorted(scan_library(root))
+        known = {}
+        if self.columns and self.root == root:
+            known = {path: row for row, path in enumerate(self.columns['path'].tolist())}
+        sizes = self.columns['size'] if known else None
+        mtimes = self.columns['mtime_ns'] if known else None
+
+        keep, stale = [], []
+        for path, size, mtime in found:
+            row = known.get(path)
+            if row is not None and sizes[row] == size and mtimes[row] == mtime:
+                keep.append(row)
+            else:
+                stale.append((path, size, mtime))
+        removed = len(known.keys() - {path for path, _, _ in found})
+        counts = {'files': len(found), 'unchanged': len(keep), 'parsed': len(stale), 'removed': removed}
+
+        if stale or removed or not self.columns:
+            features = self._parse([os.path.join(root, path) for path, _, _ in stale], workers)
+            counts['failed'] = features.count(None)
+            fresh = _rows(stale, features)
+            kept = {name: np.asarray(self.columns[name])[keep] for name in columns} if keep else None
+            merged = {name: np.concatenate([kept[name], fresh[name]]) if kept else fresh[name] for name in columns}
+            order = np.argsort(merged['path'], kind='stable')
+            self._write(root, {name: merged[name][order] for name in columns})
+        counts['seconds'] = time.perf_counter() - started
+        return counts
+
+    def _parse(self, paths, workers):
+        if workers == 1 or len(paths) < 256:
+            return _parse_many(paths)
+        workers = workers or os.cpu_count() or 1
+        chunk = max(1, len(paths) // (workers * 4))
+        chunks = [paths[i:i + chunk] for i in range(0, len(paths), chunk)]
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            return [feature for part in pool.map(_parse_many, chunks) for feature in part]
+
+    def _write(self, root, data):
+        os.makedirs(self.directory, exist_ok=True)
+        generation = f"gen-{time.time_ns()}"
+        target = os.path.join(self.directory, generation)
+        os.makedirs(target)
+        for name in columns:
+            np.save(os.path.join(target, name + '.npy'), data[name])
+        with open(os.path.join(target, 'meta.json'), 'w') as f:
+            json.dump({'version': index_version, 'root': root, 'rows': len(data['path'])}, f)
+        # Readers keep whichever generation they opened; the pointer switches atomically
+        current = os.path.join(self.directory, 'current')
+        try:
+            with open(current) as f:
+                previous = f.read().strip()
+        except FileNotFoundError:
+            previous = None
+        pointer = os.path.join(self.directory, 'current.tmp')
+        with open(pointer, 'w') as f:
+            f.write(generation)
+        os.replace(pointer, current)
+        # The generation just replaced stays for readers that read the old pointer
+        for name in os.listdir(self.directory):
+            if name.startswith('gen-') and name not in (generation, previous):
+                shutil.rmtree(os.path.join(self.directory, name), ignore_errors=True)
+        self._load()
+
+    def select(self, bpm=None, tempo=None, duration=None, density=None, notes=None, pitch=None,
+               program=None, key=None):
+        """Return the row numbers of pieces matching every given condition.
+
+        Ranges are ``(low, high)`` pairs, inclusive, with None for an open
+        end.  ``pitch`` keeps pieces whose melodic notes all lie in the
+        range.  ``program`` is one General MIDI program or a list, matching
+        pieces that use any of them.  ``key`` is a name from ``key_names``
+        (e.g. ``'A minor'``) or its index.
+        """
+        if not self.columns:
+            return np.zeros(0, dtype=np.intp)
+        c = self.columns
+        mask = np.asarray(c['ok']).copy()
+
+        def within(values, bounds):
+            low, high = bounds
+            if low is not None:
+                mask[:] &= values >= low
+            if high is not None:
+                mask[:] &= values <= high
+
+        for name, bounds in (('bpm', bpm), ('tempo', tempo), ('duration', duration), ('density', density),
+                             ('notes', notes)):
+            if bounds is not None:
+                within(c[name], bounds)
+        if pitch is not None:
+            within(c['pitch_min'], (pitch[0], None))
+            within(c['pitch_max'], (None, pitch[1]))
+            mask &= np.asarray(c['notes']) > 0
+        if program is not None:
+            wanted = np.zeros(2, dtype=np.uint64)
+            for p in ([program] if isinstance(program, int) else program):
+                wanted[p // 64] |= np.uint64(1) << np.uint64(p % 64)
+            mask &= (np.asarray(c['programs']) & wanted).any(axis=1)
+        if key is not None:
+            mask &= np.asarray(c['key']) == (key_names.index(key) if isinstance(key, str) else key)
+        return np.flatnonzero(mask)
+
+    def paths(self, rows):
+        """Return the absolute paths of index ``rows``."""
+        return [os.path.join(self.root, path) for path in self.columns['path'][rows].tolist()]
+
+    def query(self, **conditions):
+        """Return the paths of pieces matching ``conditions`` (see ``select``)."""
+        return self.paths(self.select(**conditions))
+
+    def features(self, row):
+        """Return the indexed features of one row as a dict."""
+        c = self.columns
+        mask = np.asarray(c['programs'][row])
+        return {
+            'path': os.path.join(self.root, str(c['path'][row])),
+            'tempo': int(c['tempo'][row]),
+            'bpm': float(c['bpm'][row]),
+            'duration': float(c['duration'][row]),
+            'notes': int(c['notes'][row]),
+            'density': float(c['density'][row]),
+            'pitch_range': (int(c['pitch_min'][row]), int(c['pitch_max'][row])),
+            'key': key_names[c['key'][row]] if c['key'][row] >= 0 else None,
+            'programs': [p for p in range(128) if int(mask[p // 64]) >> (p % 64) & 1],
+        }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    commands = parser.add_subparsers(dest='command', required=True)
+    update = commands.add_parser('update', help='index new and modified files under a library directory')
+    update.add_argument('library')
+    update.add_argument('--index', required=True)
+    update.add_argument('--workers', type=int, default=None)
+    query = commands.add_parser('query', help='list the pieces matching every condition')
+    query.add_argument('--index', required=True)
+    for name in ('bpm', 'duration', 'density', 'notes', 'pitch'):
+        query.add_argument(f'--{name}', nargs=2, type=float, metavar=('LOW', 'HIGH'))
+    query.add_argument('--program', type=int, nargs='+')
+    query.add_argument('--key', choices=key_names, metavar='KEY', help='e.g. "C major" or "A minor"')
+    query.add_argument('--limit', type=int, default=20)
+    args = parser.parse_args(argv)
+
+    index = LibraryIndex(args.index)
+    if args.command == 'update':
+        counts = index.update(args.library, args.workers)
+        print(', '.join(f"{name} {value:.2f}" if isinstance(value, float) else f"{name} {value}"
+                        for name, value in counts.items()))
+        return
+
+    conditions = {name: getattr(args, name) for name in ('bpm', 'duration', 'density', 'notes', 'pitch', 'program', 'key')
+                  if getattr(args, name) is not None}
+    start = time.perf_counter()
+    rows = index.select(**conditions)
+    elapsed = time.perf_counter() - start
+    for path in index.paths(rows[:args.limit]):
+        print(path)
+    print(f"{len(rows)} of {len(index)} pieces match ({elapsed * 1000:.2f} ms)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,233 @@
+"""Stream generated pieces live to a MIDI output port.
+
+Instead of saving a .mid file, ``stream`` plays pieces back-to-back on a
+python-rtmidi output (a real port or a virtual one other programs can
+connect to) or on any object with a ``send(message)`` method, such as the
+in-process ``MemorySink``.
+
+Pieces are generated in a worker process and scheduled with asyncio.  The
+scheduler keeps generation at most ``lookahead`` seconds ahead of playback,
+so producing the next piece never blocks note timing, and it records how
+late each event was sent:
+
+    python live.py happy --virtual --pieces 4 --lookahead 1.0
+"""
+import argparse
+import asyncio
+import itertools
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+import engine
+from event_buffer import EventBuffer
+
+
+def schedule(tracks, tempo, ticks_per_beat=480):
+    """Merge event-array tracks into playback order.
+
+    Returns ``(times, events, length)``: the start time of every event in
+    seconds, the events in that order as an ``EventBuffer`` (compact to hold
+    and to send between processes; see ``messages``), and the length of the
+    piece in seconds.
+    """
+    ticks = [np.cumsum(events[:, 0]) for events in tracks]
+    lengths = [int(t[-1]) if len(t) else 0 for t in ticks]
+    ticks = np.concatenate(ticks)
+    events = np.concatenate(tracks)
+    # Stable sort keeps track order for events on the same tick, like mido.merge_tracks
+    order = np.argsort(ticks, kind='stable')
+    seconds_per_tick = tempo / 1e6 / ticks_per_beat
+    return ticks[order] * seconds_per_tick, EventBuffer(events[order]), max(lengths) * seconds_per_tick
+
+
+def messages(events):
+    """Yield the raw MIDI bytes of each event as a list of ints, as output ports take them."""
+    for _, status, data1, data2 in events:
+        yield [status, data1] if status & 0xF0 in (0xC0, 0xD0) else [status, data1, data2]
+
+
+def piece_schedule(mood, seed, bars=16):
+    tracks, _ = engine.compose_events(mood, seed, bars)
+    return schedule(tracks, engine.mood_module(mood).tempo)
+
+
+class MemorySink:
+    """In-process sink that records ``(clock time, message)`` pairs."""
+
+    def __init__(self, clock=time.perf_counter):
+        self.clock = clock
+        self.messages = []
+
+    def send(self, message):
+        self.messages.append((self.clock(), message))
+
+    def close(self):
+        pass
+
+
+class RtMidiSink:
+    """Send messages to a python-rtmidi output port.
+
+    With ``virtual=True`` a new port called ``name`` is created for other
+    programs to connect to; otherwise the first port whose name contains
+    ``name`` is opened (the first port when ``name`` is None).
+    """
+
+    def __init__(self, name=None, virtual=False):
+        import rtmidi
+
+        self.midi_out = rtmidi.MidiOut()
+        if virtual:
+            self.midi_out.open_virtual_port(name or 'Music_proj')
+            return
+        ports = self.midi_out.get_ports()
+        matches = [i for i, port in enumerate(ports) if name is None or name in port]
+        if not matches:
+            raise OSError(f"no MIDI output port matching {name!r}, available: {ports}")
+        self.midi_out.open_port(matches[0])
+
+    def send(self, message):
+        self.midi_out.send_message(message)
+
+    def close(self):
+        self.midi_out.close_port()
+
+
+class TimingStats:
+    """Lateness of every sent event relative to its scheduled time."""
+
+    def __init__(self, late_threshold=0.005):
+        self.late_threshold = late_threshold
+        self.lateness = []
+
+    def record(self, lateness):
+        self.lateness.append(lateness)
+
+    def summary(self):
+        lateness = np.array(self.lateness) * 1000
+        if not len(lateness):
+            return {'events': 0, 'late_events': 0}
+        return {
+            'events': len(lateness),
+            'late_events': int((lateness > self.late_threshold * 1000).sum()),
+            'mean_ms': float(lateness.mean()),
+            'jitter_ms': float(lateness.std()),
+            'p50_ms': float(np.percentile(lateness, 50)),
+            'p99_ms': float(np.percentile(lateness, 99)),
+            'max_ms': float(lateness.max()),
+        }
+
+
+class Scheduler:
+    """Play scheduled pieces on ``sink`` with generation running ahead.
+
+    ``lookahead`` is how far (in seconds) generated material may run ahead of
+    playback.  The last ``spin`` seconds before each event are busy-waited,
+    since ``asyncio.sleep`` alone only wakes up to within about a millisecond.
+    """
+
+    def __init__(self, sink, lookahead=0.5, spin=0.001, late_threshold=0.005, clock=time.perf_counter):
+        self.sink = sink
+        self.lookahead = lookahead
+        self.spin = spin
+        self.clock = clock
+        self.stats = TimingStats(late_threshold)
+
+    async def run(self, jobs, executor):
+        """Play every ``(mood, seed, bars)`` job in order and return the timing summary."""
+        queue = asyncio.Queue()
+        # Leave the first piece time to generate before playback starts
+        self.start = self.clock() + self.lookahead
+        producer = asyncio.create_task(self._produce(jobs, executor, queue))
+        try:
+            await self._play(queue)
+            # Raises whatever stopped generation early, after playing what was already queued
+            await producer
+        finally:
+            producer.cancel()
+            self._all_notes_off()
+        return self.stats.summary()
+
+    async def _produce(self, jobs, executor, queue):
+        loop = asyncio.get_running_loop()
+        offset = self.start
+        try:
+            for mood, seed, bars in jobs:
+                # Only generate once playback is within the lookahead window of the end
+                wait = offset - self.clock() - self.lookahead
+                if wait > 0:
+                    await asyncio.sleep(wait)
+                times, events, length = await loop.run_in_executor(executor, piece_schedule, mood, seed, bars)
+                await queue.put((times + offset, events))
+                offset += length
+        finally:
+            # Playback stops at the end of the queue however generation ended
+            queue.put_nowait(None)
+
+    async def _play(self, queue):
+        while True:
+            chunk = await queue.get()
+            if chunk is None:
+                return
+            times, events = chunk
+            due_times = (due for start in range(0, len(times), 4096) for due in times[start:start + 4096].tolist())
+            for due, message in zip(due_times, messages(events)):
+                delay = due - self.clock()
+                if delay > self.spin:
+                    await asyncio.sleep(delay - self.spin)
+                while self.clock() < due:
+                    pass
+                self.sink.send(message)
+                self.stats.record(self.clock() - due)
+
+    def _all_notes_off(self):
+        for channel in range(16):
+            self.sink.send([0xB0 | channel, 123, 0])
+
+
+async def stream(mood, sink, seeds=None, bars=16, pieces=None, lookahead=0.5, executor=None):
+    """Stream pieces of ``mood`` to ``sink`` and return timing statistics.
+
+    ``seeds`` is an iterable of seeds (consecutive from 0 by default) and
+    ``pieces`` limits how many are played; with neither limit it plays until
+    cancelled.  Pieces are generated in ``executor``, a single-process pool by
+    default.
+    """
+    engine.mood_module(mood)
+    seeds = itertools.count() if seeds is None else seeds
+    jobs = ((mood, seed, bars) for seed in itertools.islice(seeds, pieces))
+    own_executor = executor is None
+    if own_executor:
+        executor = ProcessPoolExecutor(max_workers=1)
+    try:
+        return await Scheduler(sink, lookahead).run(jobs, executor)
+    finally:
+        if own_executor:
+            executor.shutdown(cancel_futures=True)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('mood', choices=sorted(engine.moods))
+    parser.add_argument('--port', default=None, help='output port name (or virtual port name with --virtual)')
+    parser.add_argument('--virtual', action='store_true', help='create a virtual output port')
+    parser.add_argument('--seed', type=int, default=0, help='seed of the first piece')
+    parser.add_argument('--pieces', type=int, default=None, help='stop after this many pieces')
+    parser.add_argument('--bars', type=int, default=16)
+    parser.add_argument('--lookahead', type=float, default=0.5, help='seconds generation may run ahead')
+    args = parser.parse_args(argv)
+
+    sink = RtMidiSink(args.port, virtual=args.virtual)
+    try:
+        stats = asyncio.run(stream(args.mood, sink, itertools.count(args.seed), args.bars, args.pieces, args.lookahead))
+    except KeyboardInterrupt:
+        return
+    finally:
+        sink.close()
+    print(' '.join(f"{key}={value:.3f}" if isinstance(value, float) else f"{key}={value}" for key, value in stats.items()))
+
+
+if __name__ == '__main__':
+    main()
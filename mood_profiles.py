@@ -0,0 +1,320 @@
+"""Mood profiles: the settings of each mood as data, compiled once.
+
+Every mood is one JSON file in ``profiles/`` holding what used to differ
+between the mood scripts: tempo, instruments, scales, harmony intervals,
+melody shape, swing, velocities, phrasing and the drum groove.  A profile is
+compiled into a ``MoodProfile`` the first time it is loaded (scale tables,
+registers, swing array and percussion groove), and that object generates
+pieces the way the scripts did.  A new mood is a new JSON file:
+
+    python mood_profiles.py happy 42
+
+Profile keys (``phrase`` and the ``melody`` options are optional)::
+
+    bpm, main_instruments, background_instruments, program_tracks,
+    scales                    name -> scale; several means one is picked per piece
+    background_intervals, complementary_intervals
+    total_bars, notes_per_bar, percussion_bars
+    melody                    max_interval, passing_tone_prob, resample_leaps
+    swing                     note durations in ticks, repeating
+    velocity                  main and background (low, high) ranges
+    humanize                  largest random note delay in ticks, 0 for none
+    phrase                    length in notes and the rest (gap) after each phrase
+    percussion_instruments, percussion   one bar of hits, see percussion.Groove
+"""
+import functools
+import hashlib
+import json
+import os
+import random
+import sys
+
+import numpy as np
+
+import instrumentation
+import percussion
+import scale_tables
+import smf_writer
+import voices
+
+profile_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'profiles')
+
+percussion_channel = 9
+channels = {'main': 0, 'main2': 1, 'main3': 2, 'background': 3, 'percussion': percussion_channel, 'second': 4}
+
+# MIDI tracks of a piece, in file order
+track_names = ['main', 'main2', 'main3', 'background', 'percussion', 'second']
+
+
+def scale_registers(scale):
+    """Return the low, middle and high registers of ``scale``."""
+    return [[note - 12 for note in scale], list(scale), [note + 12 for note in scale]]
+
+
+class MoodProfile:
+    """One compiled mood profile; generates pieces from a ``random.Random``."""
+
+    channels = channels
+    percussion_channel = percussion_channel
+    scale_registers = staticmethod(scale_registers)
+
+    def __init__(self, name, settings):
+        self.name = name
+        self.settings = settings
+        # Identifies the settings a piece was made with, for caches and resumed jobs
+        self.settings_hash = hashlib.sha256(
+            json.dumps(settings, sort_keys=True, separators=(',', ':')).encode()).hexdigest()
+        try:
+            self.description = settings.get('description', '')
+            self.bpm = settings['bpm']
+            self.tempo = smf_writer.bpm2tempo(self.bpm)
+            self.main_instruments = dict(settings['main_instruments'])
+            self.background_instruments = dict(settings['background_instruments'])
+            self.program_tracks = list(settings['program_tracks'])
+
+            self.scales = {scale_name: list(scale) for scale_name, scale in settings['scales'].items()}
+            self.scale_tables_by_name = {scale_name: scale_tables.compile_scale(scale)
+                                         for scale_name, scale in self.scales.items()}
+            # Registers and table used when the helpers are called without a piece-specific scale
+            first = next(iter(self.scales))
+            self.registers = scale_registers(self.scales[first])
+            self.scale_table = self.scale_tables_by_name[first]
+            self.background_intervals = tuple(settings['background_intervals'])
+            self.complementary_intervals = tuple(settings['complementary_intervals'])
+
+            self.total_bars = settings['total_bars']
+            self.notes_per_bar = settings['notes_per_bar']
+            self.percussion_bars = settings['percussion_bars']
+
+            melody = settings['melody']
+            self.max_interval = melody['max_interval']
+            self.passing_tone_prob = melody.get('passing_tone_prob', 0.0)
+            self.resample_leaps = melody.get('resample_leaps', False)
+
+            self.swing = np.array(settings['swing'], dtype=np.int64)
+            self.main_velocity = tuple(settings['velocity']['main'])
+            self.background_velocity = tuple(settings['velocity']['background'])
+            self.humanize = settings['humanize']
+            phrase = settings.get('phrase', {})
+            self.phrase_length = phrase.get('length', 0)
+            self.phrase_gap = phrase.get('gap', 0)
+
+            self.percussion_instruments = dict(settings['percussion_instruments'])
+            self.percussion_groove = percussion.Groove(
+                [(self.percussion_instruments[hit[0]], tuple(hit[1]) if isinstance(hit[1], list) else hit[1], *hit[2:])
+                 for hit in settings['percussion']], percussion_channel)
+        except KeyError as e:
+            raise ValueError(f"mood profile {name!r} is missing {e}") from None
+
+    def __repr__(self):
+        return f"MoodProfile({self.name!r})"
+
+    def swing_durations(self, num_notes):
+        return [int(self.swing[i % len(self.swing)]) for i in range(num_notes)]
+
+    def melody_segments(self, length=None, segment_size=6, registers=None, rng=random, counters=None):
+        # Yield the melody one register segment at a time (endless when length is None); ``counters``
+        # (see instrumentation) is only touched in the rare branches, so it costs nothing when None
+        registers = self.registers if registers is None else registers
+        max_interval = self.max_interval
+        count = 0
+        prev_note = None
+        prev_register = rng.choice(registers)
+        total_segments = length // segment_size + (1 if length % segment_size else 0) if length is not None else None
+
+        seg = 0
+        while total_segments is None or seg < total_segments:
+            seg += 1
+            available_registers = [r for r in registers if r != prev_register]
+            current_register = rng.choice(available_registers)
+            prev_register = current_register
+
+            segment = []
+            if not self.resample_leaps:
+                prev_note = None  # each segment starts on any note of its register
+            for i in range(segment_size):
+                if length is not None and count >= length:
+                    break
+                if self.resample_leaps:
+                    # Any note of the register, redrawn from the close ones when the leap is too wide
+                    note = rng.choice(current_register)
+                    if prev_note is not None and abs(note - prev_note) > max_interval:
+                        close_notes = [n for n in current_register if abs(n - prev_note) <= max_interval]
+                        if close_notes:
+                            note = rng.choice(close_notes)
+                        if counters is not None:
+                            counters['leap_resamples' if close_notes else 'melody_fallbacks'] += 1
+                else:
+                    if prev_note is None:
+                        note = rng.choice(current_register)
+                    else:
+                        # Favor stepwise motion and small skips
+                        possible_notes = [n for n in current_register if abs(n - prev_note) <= max_interval]
+                        if possible_notes:
+                            note = rng.choice(possible_notes)
+                        else:
+                            note = rng.choice(current_register)
+                            if counters is not None:
+                                counters['melody_fallbacks'] += 1
+
+                    # Occasionally add a passing tone
+                    if rng.random() < self.passing_tone_prob and count > 0:
+                        passing_tone = note + (1 if rng.random() < 0.5 else -1)
+                        if passing_tone in current_register:
+                            segment.append(passing_tone)
+                            count += 1
+                            if counters is not None:
+                                counters['passing_tones'] += 1
+
+                segment.append(note)
+                count += 1
+                prev_note = note
+            yield segment
+
+    def generate_register_changing_melody(self, length, segment_size=6, registers=None, rng=random, counters=None):
+        melody = [note for segment in self.melody_segments(length, segment_size, registers, rng, counters)
+                  for note in segment]
+        return melody[:length]
+
+    def generate_background_melody(self, main_melody, table=None, start=0):
+        return (self.scale_table if table is None else table).apply(main_melody, self.background_intervals, start).tolist()
+
+    def generate_complementary_melody(self, main_melody, table=None, start=0):
+        return (self.scale_table if table is None else table).apply(main_melody, self.complementary_intervals, start).tolist()
+
+    def layer_timings(self, velocity_ranges, num_notes, rng=random, start=0):
+        # Returns (velocities, on_deltas, off_deltas), each (layers, num_notes), for notes
+        # start..start+num_notes; every layer draws a velocity and, when humanized, a delay per note
+        humanize = self.humanize
+        ranges = [[velocity, (-humanize, humanize)] if humanize else [velocity] for velocity in velocity_ranges]
+        draws = voices.draw_integers(rng, ranges, num_notes)
+        velocities = draws[..., 0]
+        delays = draws[..., 1] if humanize else np.zeros_like(velocities)
+        index = np.arange(start, start + num_notes)
+        durations = self.swing[index % len(self.swing)]
+        # Only the first note of the piece starts late
+        on_deltas = np.where(index == 0, np.maximum(delays, 0), 0)
+        if self.phrase_length:
+            # Breathe after each phrase
+            on_deltas = on_deltas + np.where((index % self.phrase_length == self.phrase_length - 1) & (index != 0),
+                                             self.phrase_gap, 0)
+        off_deltas = np.maximum(durations - delays, 0)
+        return velocities, on_deltas, off_deltas
+
+    def note_timings(self, num_notes, is_main=False, rng=random, start=0):
+        # Returns (velocities, on_deltas, off_deltas) for notes start..start+num_notes of one track
+        velocity = self.main_velocity if is_main else self.background_velocity
+        velocities, on_deltas, off_deltas = self.layer_timings([velocity], num_notes, rng, start)
+        return velocities[0], on_deltas[0], off_deltas[0]
+
+    def note_events(self, channel, melody, is_main=False, rng=random):
+        return smf_writer.note_events(channel, melody, *self.note_timings(len(melody), is_main, rng))
+
+    def add_notes(self, track, channel, melody, is_main=False, rng=random):
+        track.extend(smf_writer.to_messages(self.note_events(channel, melody, is_main, rng)))
+
+    def voice_layers(self, main_melody, table=None, rng=random, start=0):
+        """Return every melodic layer of a piece as a ``(layer, note)`` array of ``voices.note_dtype``."""
+        table = self.scale_table if table is None else table
+        with instrumentation.stage('harmony'):
+            pitches = voices.layer_pitches(main_melody, table, self.background_intervals,
+                                           self.complementary_intervals, start)
+        velocity_ranges = [self.background_velocity if layer == 'background' else self.main_velocity
+                           for layer in voices.layer_names]
+        with instrumentation.stage('notes'):
+            return voices.layer_notes(pitches, *self.layer_timings(velocity_ranges, pitches.shape[1], rng, start))
+
+    def percussion_events(self, bars=16, rng=random):
+        return self.percussion_groove.events(bars, rng)
+
+    def add_percussion(self, track, bars=16, rng=random):
+        track.extend(smf_writer.to_messages(self.percussion_events(bars, rng)))
+
+    def pick_scale(self, rng):
+        """Return ``(name, registers, table)`` for one piece; only moods with several scales draw from ``rng``."""
+        if len(self.scales) == 1:
+            return None, self.registers, self.scale_table
+        scale_name, scale = rng.choice(list(self.scales.items()))
+        return scale_name, scale_registers(scale), self.scale_tables_by_name[scale_name]
+
+    def compose_events(self, rng, bars=None):
+        """Compose one piece from ``rng`` and return ``(tracks, choices)``.
+
+        ``tracks`` holds one event array per MIDI track, in file order, and
+        ``choices`` maps each randomly picked setting to its name.
+        """
+        bars = self.total_bars if bars is None else bars
+        main_instr_name, main_instr_prog = rng.choice(list(self.main_instruments.items()))
+        background_instr_name, background_instr_prog = rng.choice(list(self.background_instruments.items()))
+        choices = {'main': main_instr_name, 'background': background_instr_name}
+        scale_name, registers, table = self.pick_scale(rng)
+        if scale_name is not None:
+            choices['scale'] = scale_name
+
+        counters = instrumentation.counters()
+        with instrumentation.stage('melody'):
+            main_melody = self.generate_register_changing_melody(bars * self.notes_per_bar, segment_size=6,
+                                                                 registers=registers, rng=rng, counters=counters)
+        layers = self.voice_layers(main_melody, table, rng=rng)
+        with instrumentation.stage('events'):
+            tracks = dict(zip(voices.layer_names, smf_writer.layer_events(
+                layers, [channels[name] for name in voices.layer_names])))
+        with instrumentation.stage('percussion'):
+            tracks['percussion'] = self.percussion_events(self.percussion_bars, rng=rng)
+        if counters is not None:
+            counters['notes'] += layers.size
+
+        programs = {'background': background_instr_prog}
+        for name in self.program_tracks:
+            program = smf_writer.program_event(channels[name], programs.get(name, main_instr_prog))
+            tracks[name] = np.concatenate([program, tracks[name]])
+        return [tracks[name] for name in track_names], choices
+
+    def build_midi(self, rng, bars=None):
+        """Compose one piece from ``rng`` and return ``(mid, choices)``."""
+        tracks, choices = self.compose_events(rng, bars)
+        return smf_writer.to_midi_file(tracks, self.tempo), choices
+
+
+def load_profile(path):
+    """Compile the profile in the JSON file ``path``; the mood is named after the file."""
+    with open(path) as f:
+        settings = json.load(f)
+    return MoodProfile(os.path.splitext(os.path.basename(path))[0], settings)
+
+
+@functools.lru_cache(maxsize=None)
+def profile(name):
+    """Return the compiled profile of mood ``name`` from ``profile_dir``."""
+    path = os.path.join(profile_dir, name + '.json')
+    if not os.path.exists(path):
+        raise ValueError(f"unknown mood {name!r}, expected one of {available()}")
+    return load_profile(path)
+
+
+def available():
+    """Return the names of the moods in ``profile_dir``."""
+    return sorted(os.path.splitext(name)[0] for name in os.listdir(profile_dir) if name.endswith('.json'))
+
+
+def run(name, argv):
+    """Command line of a mood: ``[seed]``; save one piece as ``<mood>_<seed>.mid``."""
+    mood = profile(name)
+    # Pass a seed to reproduce a piece; otherwise one is picked and printed
+    seed = int(argv[0]) if argv else random.randrange(1000000)
+    mid, choices = mood.build_midi(random.Random(seed))
+    print(f"Seed: {seed}")
+    print(f"Main instrument: {choices['main']}")
+    print(f"Background instrument: {choices['background']}")
+    if 'scale' in choices:
+        print(f"Using scale: {choices['scale']}")
+
+    filename = f"{name}_{seed}.mid"
+    mid.save(filename)
+    print(f"Saved {filename}")
+
+
+if __name__ == '__main__':
+    if len(sys.argv) < 2:
+        sys.exit(f"usage: python mood_profiles.py MOOD [SEED]  (moods: {', '.join(available())})")
+    run(sys.argv[1], sys.argv[2:])
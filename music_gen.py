@@ -0,0 +1,199 @@
+"""Generate one piece of any mood from the command line, fast.
+
+    python music_gen.py happy --seed 42 --bars 16 --out piece.mid
+
+Replaces running the mood scripts one at a time.  Most of a cold start is
+importing NumPy and the generators.  Even ``argparse``, ``json`` and
+``socket`` add about 10ms through ``re`` and ``enum``.  So this module
+parses the usual command line by hand and imports nothing beyond ``os``
+and ``sys`` at startup.  ``argparse`` is loaded only for ``--help`` and
+errors.
+
+A run first tries a warm daemon on a Unix socket, which keeps the
+generators loaded.  It imports them itself only when no daemon is running.
+Start the daemon once with:
+
+    python music_gen.py serve &
+
+With the daemon running, a run costs interpreter startup plus one round
+trip on the socket.  The daemon writes the file itself, so no MIDI data
+crosses the socket.  Each request is one tab-separated line: mood, seed,
+bars and the absolute output path.  The reply is ``ok`` or ``error`` on the
+first line, followed by text to print.  ``--no-daemon`` always generates in
+this process.  ``python -m benchmarks.bench_startup`` times cold and warm
+runs against the mood scripts.
+"""
+import os
+import sys
+
+profile_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'profiles')
+
+_flags = {'--seed': int, '--bars': int, '--out': str, '--socket': str}
+
+
+def default_socket():
+    directory = os.environ.get('XDG_RUNTIME_DIR') or '/tmp'
+    return os.environ.get('MUSIC_GEN_SOCKET') or os.path.join(directory, f"music-gen-{os.getuid()}.sock")
+
+
+def available():
+    # Same as mood_profiles.available, without importing it
+    return sorted(os.path.splitext(name)[0] for name in os.listdir(profile_dir) if name.endswith('.json'))
+
+
+def describe(choices):
+    lines = [f"Main instrument: {choices['main']}", f"Background instrument: {choices['background']}"]
+    if 'scale' in choices:
+        lines.append(f"Using scale: {choices['scale']}")
+    return '\n'.join(lines)
+
+
+def generate(mood, seed, bars, path):
+    """Write one piece to ``path``; return the random choices made."""
+    import random
+
+    import mood_profiles
+    import smf_writer
+
+    profile = mood_profiles.profile(mood)
+    tracks, choices = profile.compose_events(random.Random(seed), bars)
+    with open(path, 'wb') as f:
+        f.write(smf_writer.encode_file(tracks, profile.tempo))
+    return choices
+
+
+def request(socket_path, mood, seed, bars, path, timeout=30.0):
+    """Ask the daemon for a piece; return ``(ok, text)``, or None when no daemon is listening."""
+    # The C module directly: the socket wrapper imports enum
+    import _socket
+
+    client = _socket.socket(_socket.AF_UNIX, _socket.SOCK_STREAM)
+    client.settimeout(timeout)
+    try:
+        client.connect(socket_path)
+    except (FileNotFoundError, ConnectionRefusedError):
+        client.close()
+        return None
+    try:
+        client.sendall(f"{mood}\t{seed}\t{bars}\t{path}\n".encode())
+        reply = bytearray()
+        while chunk := client.recv(4096):
+            reply += chunk
+    finally:
+        client.close()
+    status, _, text = reply.decode().partition('\n')
+    return status == 'ok', text
+
+
+async def _handle(reader, writer):
+    try:
+        mood, seed, bars, path = (await reader.readline()).decode().rstrip('\n').split('\t')
+        reply = 'ok\n' + describe(generate(mood, int(seed), int(bars), path))
+    except (ValueError, OSError) as error:
+        reply = f"error\n{error}"
+    writer.write(reply.encode())
+    await writer.drain()
+    writer.close()
+
+
+def serve(socket_path):
+    """Run the warm daemon on ``socket_path`` until interrupted or terminated."""
+    import asyncio
+    import signal
+
+    import engine
+
+    if os.path.exists(socket_path):
+        if request(socket_path, 'ping', 0, 0, '', timeout=1.0) is not None:
+            sys.exit(f"a daemon is already listening on {socket_path}")
+        os.remove(socket_path)  # left behind by a daemon that did not shut down cleanly
+    # Run every mood once so the first real request is as fast as the rest
+    for mood in engine.moods:
+        engine.generate_bytes(mood, 0)
+
+    async def run():
+        # Create the socket owner-only; a chmod after bind would leave a window for other users
+        umask = os.umask(0o177)
+        try:
+            server = await asyncio.start_unix_server(_handle, socket_path)
+        finally:
+            os.umask(umask)
+        stop = asyncio.Event()
+        asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, stop.set)
+        print(f"Serving {', '.join(engine.moods)} on {socket_path}", flush=True)
+        async with server:
+            await stop.wait()
+
+    try:
+        asyncio.run(run())
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if os.path.exists(socket_path):
+            os.remove(socket_path)
+
+
+def _parser():
+    import argparse
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0],
+                                     epilog='"python music_gen.py serve" starts the warm daemon')
+    parser.add_argument('mood', choices=available())
+    parser.add_argument('--seed', type=int, default=None, help='seed to reproduce a piece (random by default)')
+    parser.add_argument('--bars', type=int, default=16)
+    parser.add_argument('--out', default=None, help='output file (default <mood>_<seed>.mid)')
+    parser.add_argument('--socket', default=None, help='daemon socket (default $MUSIC_GEN_SOCKET or a per-user path)')
+    parser.add_argument('--no-daemon', action='store_true', help='always generate in this process')
+    return parser
+
+
+def parse_args(argv):
+    """Parse the usual command line without argparse; return None for anything else."""
+    if not argv or argv[0] not in available():
+        return None
+    options = {'mood': argv[0], 'seed': None, 'bars': 16, 'out': None, 'socket': None, 'no_daemon': False}
+    rest = iter(argv[1:])
+    for flag in rest:
+        if flag == '--no-daemon':
+            options['no_daemon'] = True
+            continue
+        flag, has_value, value = flag.partition('=')
+        if flag not in _flags:
+            return None
+        try:
+            options[flag[2:]] = _flags[flag](value if has_value else next(rest))
+        except (StopIteration, ValueError):
+            return None
+    return options
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if argv[:1] == ['serve']:
+        import argparse
+
+        parser = argparse.ArgumentParser(prog='music_gen.py serve', description='Keep the generators warm for music_gen.py')
+        parser.add_argument('--socket', default=default_socket())
+        serve(parser.parse_args(argv[1:]).socket)
+        return
+
+    options = parse_args(argv)
+    if options is None:
+        options = vars(_parser().parse_args(argv))
+    mood, seed, bars = options['mood'], options['seed'], options['bars']
+    if seed is None:
+        seed = int.from_bytes(os.urandom(4), 'big') % 1000000
+    out = options['out'] or f"{mood}_{seed}.mid"
+    reply = None
+    if not options['no_daemon']:
+        reply = request(options['socket'] or default_socket(), mood, seed, bars, os.path.abspath(out))
+    if reply is None:
+        reply = True, describe(generate(mood, seed, bars, out))
+    ok, text = reply
+    if not ok:
+        sys.exit(text)
+    print(f"Seed: {seed}\n{text}\nSaved {out}")
+
+
+if __name__ == '__main__':
+    main()
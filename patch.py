@@ -0,0 +1,249 @@
+"""Change the tempo or instruments of existing .mid files without regenerating them.
+
+Rerunning a script re-randomizes the whole piece.  This module edits the
+bytes of a file instead: the 3-byte value of every ``set_tempo`` meta
+event and the program number of ``program_change`` messages.  Neither
+edit changes the file's length, so files are patched in place through
+``mmap``, or copied with the edits to another directory.
+
+Finding the events needs no full decode.  In each track, ``rfind`` locates
+the last byte that could start a tempo or program event, and the event walk
+stops there, or once past it at the first event not under a running
+``program_change`` status.  The generated files keep these events at the start of each
+track, so only a few events per track are ever walked.  Channels that have
+no ``program_change`` are left alone, since adding one would mean
+rewriting the track.
+
+``patch_directory`` patches a whole catalog on a thread pool.  The work per
+file is a few small reads and writes, so the run is limited by I/O, not CPU:
+
+    python patch.py catalog --main vibraphone --bpm-delta 10
+    python patch.py catalog --out catalog_slow --bpm 80 --program 3=48
+"""
+import argparse
+import mmap
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import engine
+import library_index
+import mood_profiles
+import smf_writer
+
+_program_statuses = [bytes([0xC0 | channel]) for channel in range(16)]
+
+
+def instrument_programs():
+    """Map every instrument name used by a mood profile to its General MIDI program."""
+    programs = {}
+    for profile in engine.moods.values():
+        programs.update(profile.main_instruments)
+        programs.update(profile.background_instruments)
+    return programs
+
+
+# The channels that play each instrument a mood picks; 'main' is doubled in octaves and on the second line
+roles = {'main': [mood_profiles.channels[name] for name in ('main', 'main2', 'main3', 'second')],
+         'background': [mood_profiles.channels['background']]}
+
+
+def patch_points(data):
+    """Return ``(tempos, programs)``: offsets of set_tempo values and ``(offset, channel)`` of program numbers.
+
+    ``data`` is any bytes-like object with ``rfind`` (bytes, bytearray or
+    mmap).  Raises ValueError for data that is not a well-formed SMF.
+    """
+    try:
+        return _patch_points(data)
+    except IndexError:
+        raise ValueError('truncated track') from None
+
+
+def _patch_points(data):
+    size = len(data)
+    if size < 14 or data[:4] != b'MThd':
+        raise ValueError('not a Standard MIDI File')
+    tempos, programs = [], []
+    pos = 8 + int.from_bytes(data[4:8], 'big')
+    while pos + 8 <= size:
+        length = int.from_bytes(data[pos + 4:pos + 8], 'big')
+        i, end = pos + 8, min(pos + 8 + length, size)
+        if data[pos:pos + 4] != b'MTrk':
+            pos = end
+            continue
+        # Nothing to patch past the last byte that could start a tempo or program event,
+        # except program changes that follow it under running status
+        last = max([data.rfind(b'\xff\x51\x03', i, end)] + [data.rfind(status, i, end) for status in _program_statuses])
+        status = 0
+        while i < end and (i <= last or status & 0xF0 == 0xC0):
+            byte = data[i]
+            i += 1
+            while byte & 0x80:
+                byte = data[i]
+                i += 1
+
+            byte = data[i]
+            if byte == 0xFF or byte == 0xF0 or byte == 0xF7:
+                # Meta events have a type byte before the length, sysex events do not
+                kind = data[i + 1] if byte == 0xFF else None
+                i += 2 if byte == 0xFF else 1
+                byte = data[i]
+                i += 1
+                event_length = byte & 0x7F
+                while byte & 0x80:
+                    byte = data[i]
+                    i += 1
+                    event_length = (event_length << 7) | (byte & 0x7F)
+                if kind == 0x51 and event_length == 3:
+                    tempos.append(i)
+                i += event_length
+                continue
+            if byte & 0x80:
+                status = byte
+                i += 1
+            kind = status & 0xF0
+            if kind == 0xC0:
+                programs.append((i, status & 0x0F))
+            i += 1 if kind in (0xC0, 0xD0) else 2
+        pos = end
+    return tempos, programs
+
+
+def patch_buffer(buffer, bpm=None, bpm_delta=None, programs=None):
+    """Apply the changes to a writable SMF buffer; return the number of events changed.
+
+    ``bpm`` sets the first tempo to ``bpm`` and scales any later tempo
+    changes by the same factor.  ``bpm_delta`` adds to every tempo's bpm.
+    ``programs`` maps channels to new program numbers.  Raises ValueError,
+    leaving the buffer untouched, when a tempo would not be positive or
+    would not fit in a set_tempo event.
+    """
+    if bpm is not None and bpm <= 0:
+        raise ValueError(f"bpm must be positive, got {bpm:g}")
+    tempos, program_points = patch_points(buffer)
+    changed = 0
+    if tempos and (bpm is not None or bpm_delta is not None):
+        values = [int.from_bytes(buffer[offset:offset + 3], 'big') for offset in tempos]
+        if bpm is not None:
+            new_values = [round(tempo * smf_writer.bpm2tempo(bpm) / values[0]) for tempo in values]
+        else:
+            bpms = [smf_writer.tempo2bpm(tempo) + bpm_delta for tempo in values]
+            if min(bpms) <= 0:
+                raise ValueError(f"a tempo of {min(bpms) - bpm_delta:g} bpm would drop to {min(bpms):g} bpm")
+            new_values = [smf_writer.bpm2tempo(value) for value in bpms]
+        # Check every value before writing any, so a bad change leaves the file untouched
+        for new in new_values:
+            if not 0 < new < 1 << 24:
+                raise ValueError(f"tempo {new} does not fit in a set_tempo event")
+        for offset, tempo, new in zip(tempos, values, new_values):
+            if new != tempo:
+                buffer[offset:offset + 3] = new.to_bytes(3, 'big')
+                changed += 1
+    for offset, channel in program_points:
+        program = (programs or {}).get(channel)
+        if program is not None and buffer[offset] != program:
+            buffer[offset] = program
+            changed += 1
+    return changed
+
+
+def patch_file(path, out=None, **changes):
+    """Patch ``path`` in place, or write the patched copy to ``out``; return the number of events changed."""
+    if out is None:
+        with open(path, 'r+b') as f, mmap.mmap(f.fileno(), 0) as buffer:
+            return patch_buffer(buffer, **changes)
+    with open(path, 'rb') as f:
+        buffer = bytearray(f.read())
+    changed = patch_buffer(buffer, **changes)
+    os.makedirs(os.path.dirname(out) or '.', exist_ok=True)
+    with open(out, 'wb') as f:
+        f.write(buffer)
+    return changed
+
+
+def patch_directory(root, out_root=None, workers=16, **changes):
+    """Patch every .mid file under ``root`` on a thread pool.
+
+    Returns ``{'files', 'patched', 'events', 'failed', 'errors', 'seconds'}``.
+    Files that cannot be patched (not valid MIDI, or a tempo out of range)
+    are left untouched, counted as failed and listed in ``errors`` as
+    ``(path, message)``.
+    """
+    start = time.perf_counter()
+    paths = [path for path, _, _ in library_index.scan_library(root)]
+
+    def patch_one(path):
+        try:
+            return patch_file(os.path.join(root, path), None if out_root is None else os.path.join(out_root, path),
+                              **changes)
+        except (OSError, ValueError) as error:
+            return error
+
+    counts = {'files': len(paths), 'patched': 0, 'events': 0, 'failed': 0, 'errors': []}
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for path, changed in zip(paths, pool.map(patch_one, paths)):
+            if isinstance(changed, Exception):
+                counts['failed'] += 1
+                counts['errors'].append((path, str(changed)))
+            else:
+                counts['patched'] += changed > 0
+                counts['events'] += changed
+    counts['seconds'] = time.perf_counter() - start
+    return counts
+
+
+def _program_changes(args, parser):
+    names = instrument_programs()
+    programs = {}
+    for role in roles:
+        name = getattr(args, role)
+        if name is None:
+            continue
+        program = int(name) if name.isdigit() else names.get(name)
+        if program is None or not 0 <= program <= 127:
+            parser.error(f"unknown instrument {name!r}, expected a program number or one of {sorted(names)}")
+        programs.update(dict.fromkeys(roles[role], program))
+    for entry in args.program:
+        channel, _, program = entry.partition('=')
+        if not (channel.isdigit() and program.isdigit() and int(channel) < 16 and int(program) < 128):
+            parser.error(f"--program expects CHANNEL=PROGRAM, got {entry!r}")
+        programs[int(channel)] = int(program)
+    return programs
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('path', help='a .mid file or a directory of them')
+    parser.add_argument('--out', default=None, help='write patched copies here instead of patching in place')
+    tempo = parser.add_mutually_exclusive_group()
+    tempo.add_argument('--bpm', type=float, default=None, help='new tempo in beats per minute')
+    tempo.add_argument('--bpm-delta', type=float, default=None, help='beats per minute to add (negative to slow down)')
+    parser.add_argument('--main', default=None, help='instrument name or program for the main melody layers')
+    parser.add_argument('--background', default=None, help='instrument name or program for the background line')
+    parser.add_argument('--program', action='append', default=[], metavar='CHANNEL=PROGRAM')
+    parser.add_argument('--workers', type=int, default=16)
+    args = parser.parse_args(argv)
+    if args.bpm is not None and args.bpm <= 0:
+        parser.error(f"--bpm must be positive, got {args.bpm:g}")
+
+    changes = {'bpm': args.bpm, 'bpm_delta': args.bpm_delta, 'programs': _program_changes(args, parser)}
+    if os.path.isdir(args.path):
+        counts = patch_directory(args.path, args.out, args.workers, **changes)
+        print(f"Patched {counts['patched']} of {counts['files']} files ({counts['events']} events, "
+              f"{counts['failed']} failed) in {counts['seconds']:.2f}s")
+        for path, error in counts['errors'][:20]:
+            print(f"  {path}: {error}")
+        if len(counts['errors']) > 20:
+            print(f"  and {len(counts['errors']) - 20} more")
+    else:
+        try:
+            changed = patch_file(args.path, args.out, **changes)
+        except ValueError as error:
+            sys.exit(f"{args.path}: {error}")
+        print(f"Changed {changed} events in {args.out or args.path}")
+
+
+if __name__ == '__main__':
+    main()
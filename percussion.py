@@ -0,0 +1,70 @@
+"""Drum grooves compiled once into event blocks and tiled bar by bar.
+
+A ``Groove`` describes one bar of a kit as a list of hits.  The bar is
+compiled to an event array when the groove is created; a piece is then the
+block tiled once per bar, with the per-bar random choices (velocities and
+whether optional hits such as open hi-hats play) applied as masks over the
+whole array.
+"""
+import numpy as np
+
+import smf_writer
+
+
+class Groove:
+    """One bar of percussion, compiled to an event block.
+
+    ``hits`` lists ``(note, velocity, delay, length[, probability])`` in
+    playing order: the note starts ``delay`` ticks after the previous event
+    and stops ``length`` ticks later.  ``velocity`` is a number or a
+    ``(low, high)`` range drawn with ``rng.randint`` every bar, and a hit with
+    a ``probability`` below 1 only plays in bars where ``rng.random()`` falls
+    under it.  A skipped hit's delay still passes before the next hit.  Each
+    bar draws in hit order, velocity before probability.
+    """
+
+    def __init__(self, hits, channel):
+        self.hits = [tuple(hit) + (1.0,) * (5 - len(hit)) for hit in hits]
+        note_on, note_off = smf_writer.NOTE_ON | channel, smf_writer.NOTE_OFF | channel
+        rows = []
+        # Random draws of one bar, in order: (kind, hit index, argument)
+        self.draws = []
+        for i, (note, velocity, delay, length, probability) in enumerate(self.hits):
+            if isinstance(velocity, tuple):
+                self.draws.append(('velocity', i, velocity))
+                velocity = 0
+            if probability < 1:
+                self.draws.append(('optional', i, probability))
+            rows.append((delay, note_on, note, velocity))
+            rows.append((length, note_off, note, 0))
+        self.block = smf_writer.event_array(rows)
+
+    def _draw(self, bars, rng):
+        # The only per-bar Python work left: the random calls, in the order the kit plays
+        calls = [(lambda low=arg[0], high=arg[1]: rng.randint(low, high)) if kind == 'velocity' else rng.random
+                 for kind, _, arg in self.draws]
+        return np.array([call() for _ in range(bars) for call in calls], dtype=np.float64).reshape(bars, len(calls))
+
+    def events(self, bars, rng):
+        """Return the event array of ``bars`` bars of the groove."""
+        events = np.tile(self.block, (bars, 1))
+        if self.draws and bars:
+            values = self._draw(bars, rng)
+            per_bar = events.reshape(bars, len(self.block), 4)
+            keep = np.ones((bars, len(self.hits)), dtype=bool)
+            for column, (kind, i, arg) in enumerate(self.draws):
+                if kind == 'velocity':
+                    per_bar[:, 2 * i, 3] = values[:, column]
+                else:
+                    keep[:, i] = values[:, column] < arg
+            # Dropping a hit drops both its note_on and note_off; its delay moves on to
+            # the next event that plays, so the hits after it keep their place
+            kept = np.repeat(keep.ravel(), 2)
+            delays = np.where(kept, 0, events[:, 0])
+            delays[1::2] = 0
+            carried = np.cumsum(delays)[kept]
+            events = events[kept]
+            events[:, 0] += np.diff(carried, prepend=0)
+        if len(events):
+            events[0, 0] = 0  # the piece starts on its first hit
+        return events
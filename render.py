@@ -0,0 +1,267 @@
+"""Render generated pieces to PCM WAV without VLC or a SoundFont.
+
+Notes are synthesized with small NumPy voices, one per family of General MIDI
+programs (piano, strings, organ and synth leads), plus a one-shot drum kit for
+channel 9.  Each pitched voice reads a precomputed single-cycle wavetable and
+shapes it with an attack/decay/release envelope, one whole note at a time.
+
+The output is produced in fixed-size blocks that are written to disk as
+they are finished, so memory use depends on the block size and the number of
+notes, not on the length of the audio:
+
+    python render.py happy --seed 1 --out happy_1.wav
+    python render.py 123456.mid
+"""
+import argparse
+import os
+import wave
+
+import mido
+import numpy as np
+
+import engine
+
+wavetable_size = 2048
+percussion_channel = 9
+note_dtype = np.dtype([('start', 'f8'), ('end', 'f8'), ('note', 'i2'), ('velocity', 'i2'),
+                       ('channel', 'i2'), ('program', 'i2')])
+
+# Harmonic amplitudes of each family's wavetable, and its envelope:
+# attack and release in seconds, decay as an exponential rate per second
+voices = {
+    'piano': {'harmonics': [1.0, 0.45, 0.25, 0.12, 0.06], 'attack': 0.004, 'decay': 2.5, 'release': 0.12, 'gain': 0.9},
+    'strings': {'harmonics': [1.0 / k for k in range(1, 9)], 'attack': 0.08, 'decay': 0.1, 'release': 0.25, 'gain': 0.55},
+    'organ': {'harmonics': [1.0, 0.8, 0.0, 0.6, 0.0, 0.3, 0.0, 0.2], 'attack': 0.01, 'decay': 0.0, 'release': 0.05, 'gain': 0.5},
+    'lead': {'harmonics': [1.0 / k if k % 2 else 0.0 for k in range(1, 12)], 'attack': 0.01, 'decay': 0.6, 'release': 0.08, 'gain': 0.45},
+}
+
+
+def program_family(program):
+    """Map a General MIDI program number to one of the ``voices``."""
+    if program < 16 or 24 <= program < 32:
+        return 'piano'  # pianos, chromatic percussion and guitars decay like struck strings
+    if 16 <= program < 24:
+        return 'organ'
+    if 40 <= program < 56 or 88 <= program < 96:
+        return 'strings'  # orchestral strings, ensembles and pads
+    if 64 <= program < 80:
+        return 'organ'  # reeds and pipes hold a steady tone
+    return 'lead'  # basses, brass and synth leads
+
+
+def _wavetable(harmonics):
+    phase = np.arange(wavetable_size) * (2 * np.pi / wavetable_size)
+    table = sum(amp * np.sin(k * phase) for k, amp in enumerate(harmonics, start=1))
+    return (table / np.abs(table).max()).astype(np.float32)
+
+
+def drum_kit(sample_rate):
+    """Return one-shot samples for the General MIDI drum notes the scripts use."""
+    noise_rng = np.random.default_rng(0)
+
+    def hit(seconds):
+        return np.arange(int(seconds * sample_rate)) / sample_rate
+
+    t = hit(0.35)
+    kick = np.sin(2 * np.pi * (50 * t + 100 / 25 * (1 - np.exp(-25 * t)))) * np.exp(-9 * t)
+    t = hit(0.25)
+    snare = (0.7 * noise_rng.uniform(-1, 1, len(t)) + 0.5 * np.sin(2 * np.pi * 185 * t)) * np.exp(-18 * t)
+    closed = np.diff(noise_rng.uniform(-1, 1, int(0.06 * sample_rate) + 1)) * np.exp(-70 * hit(0.06)) * 0.5
+    opened = np.diff(noise_rng.uniform(-1, 1, int(0.4 * sample_rate) + 1)) * np.exp(-9 * hit(0.4)) * 0.4
+    kit = {36: kick, 38: snare, 42: closed, 46: opened}
+    return {note: sample.astype(np.float32) for note, sample in kit.items()}
+
+
+def _track_notes(events, programs):
+    # Pair the note events of one track into (start tick, end tick, note, velocity, channel, program)
+    # arrays, in the order the notes end.  ``programs`` holds each channel's program when the track
+    # starts and is updated with the track's program changes.
+    events = np.asarray(events, dtype=np.int64).reshape(-1, 4)
+    ticks = np.cumsum(events[:, 0])
+    kind, channel = events[:, 1] & 0xF0, events[:, 1] & 0x0F
+    is_on = (kind == 0x90) & (events[:, 3] > 0)
+    index = np.flatnonzero(is_on | (kind == 0x80) | (kind == 0x90))
+    # Group the note events by (channel, note), in track order within each group
+    key = channel[index] * 128 + events[index, 2]
+    order = np.argsort(key, kind='stable')
+    index, key = index[order], key[order]
+    step = np.where(is_on[index], 1, -1)
+    starts_group = np.r_[True, key[1:] != key[:-1]][:len(key)]
+    first, group = np.flatnonzero(starts_group), np.cumsum(starts_group) - 1
+    # Notes open in each group; a note off with nothing open is ignored, so the count stops at 0
+    total = np.cumsum(step)
+    running = total - (total - step)[first][group]
+    spread = 2 * len(step) + 1
+    lowest = np.minimum.accumulate(running - group * spread) + group * spread
+    open_notes = running - np.minimum(lowest, 0)
+    before = np.r_[0, open_notes[:-1]]
+    before[first] = 0
+    closes = (step < 0) & (before > 0)
+    # The k-th note off that closes something in a group ends the group's k-th note on
+    ons = np.flatnonzero(step > 0)
+    ons_before = (np.cumsum(step > 0) - (step > 0))[first]
+    closed_before = (np.cumsum(closes) - closes)[first]
+    off = np.flatnonzero(closes)
+    on = ons[ons_before[group[off]] + np.cumsum(closes)[off] - closed_before[group[off]] - 1]
+    on, off = index[on], index[off]
+    order = np.argsort(off, kind='stable')
+    on, off = on[order], off[order]
+
+    program = np.zeros(len(off), dtype=np.int64)
+    changes = np.flatnonzero(kind == 0xC0)
+    for ch in range(16):
+        rows = channel[off] == ch
+        at = changes[channel[changes] == ch]
+        values = np.r_[programs.get(ch, 0), events[at, 2]]
+        program[rows] = values[np.searchsorted(at, off[rows])]
+        if len(at):
+            programs[ch] = int(values[-1])
+    return ticks[on], ticks[off], events[on, 2], events[on, 3], channel[off], program
+
+
+def note_table(tracks, tempo, ticks_per_beat=480):
+    """Pair note_on/note_off events into a table of notes sorted by start time.
+
+    Returns a structured array with ``start`` and ``end`` in seconds,
+    ``note``, ``velocity``, ``channel`` and ``program``.  Notes are paired
+    with array operations, track by track, so the table costs 20 bytes per
+    note and no Python object per event.
+    """
+    seconds_per_tick = tempo / 1e6 / ticks_per_beat
+    programs = {}
+    columns = [_track_notes(events, programs) for events in tracks]
+    notes = np.zeros(sum(len(column[0]) for column in columns), dtype=note_dtype)
+    position = 0
+    for start, end, note, velocity, channel, program in columns:
+        rows = notes[position:position + len(start)]
+        rows['start'], rows['end'] = start * seconds_per_tick, end * seconds_per_tick
+        rows['note'], rows['velocity'], rows['channel'], rows['program'] = note, velocity, channel, program
+        position += len(start)
+    return np.sort(notes, order='start', kind='stable')
+
+
+def midi_file_tracks(path):
+    """Read a .mid file into event-array tracks plus its (first) tempo."""
+    mid = mido.MidiFile(path)
+    tempo = None
+    tracks = []
+    for track in mid.tracks:
+        rows = []
+        delta = 0
+        for msg in track:
+            delta += msg.time
+            if msg.type == 'set_tempo' and tempo is None:
+                tempo = msg.tempo
+            if msg.is_meta or msg.type == 'sysex':
+                continue
+            data = msg.bytes() + [0, 0]
+            rows.append((delta, data[0], data[1], data[2]))
+            delta = 0
+        tracks.append(np.array(rows, dtype=np.int64).reshape(-1, 4))
+    return tracks, tempo or 500000, mid.ticks_per_beat
+
+
+class Renderer:
+    """Synthesize a note table block by block."""
+
+    def __init__(self, sample_rate=44100, block_size=65536):
+        self.sample_rate = sample_rate
+        self.block_size = block_size
+        self.tables = {family: _wavetable(voice['harmonics']) for family, voice in voices.items()}
+        self.drums = drum_kit(sample_rate)
+
+    def blocks(self, notes):
+        """Yield float32 blocks of mono audio covering every note."""
+        sr = self.sample_rate
+        names = list(voices)
+        families = np.array([names.index(program_family(p)) for p in range(128)], dtype=np.int8)
+        pitched = notes[notes['channel'] != percussion_channel]
+        drums = notes[notes['channel'] == percussion_channel]
+        family = families[pitched['program']]
+        release = np.array([voices[name]['release'] for name in names])[family]
+
+        # Sample positions of every note, including its release tail
+        starts = np.round(pitched['start'] * sr).astype(np.int64)
+        ends = np.round(pitched['end'] * sr).astype(np.int64)
+        stops = ends + np.round(release * sr).astype(np.int64)
+        drum_starts = np.round(drums['start'] * sr).astype(np.int64)
+        drum_stops = drum_starts + np.array([len(self.drums.get(n, self.drums[38])) for n in drums['note']], dtype=np.int64)
+        longest = max(int((stops - starts).max()) if len(starts) else 0,
+                      int((drum_stops - drum_starts).max()) if len(drum_starts) else 0)
+        total = max(int(stops.max()) if len(stops) else 0, int(drum_stops.max()) if len(drum_stops) else 0)
+
+        for block_start in range(0, total, self.block_size):
+            block_end = min(block_start + self.block_size, total)
+            out = np.zeros(block_end - block_start, dtype=np.float32)
+            # Notes are sorted by start, so only a window of them can overlap the block
+            lo = np.searchsorted(starts, block_start - longest)
+            hi = np.searchsorted(starts, block_end)
+            for i in range(lo, hi):
+                if stops[i] > block_start:
+                    self._add_note(out, block_start, starts[i], ends[i], stops[i], pitched[i], names[family[i]])
+            lo = np.searchsorted(drum_starts, block_start - longest)
+            hi = np.searchsorted(drum_starts, block_end)
+            for i in range(lo, hi):
+                if drum_stops[i] > block_start:
+                    sample = self.drums.get(int(drums['note'][i]), self.drums[38])
+                    a, b = max(drum_starts[i], block_start), min(drum_stops[i], block_end)
+                    offset = a - drum_starts[i]
+                    out[a - block_start:b - block_start] += sample[offset:offset + b - a] * (drums['velocity'][i] / 127)
+            # Fixed headroom plus soft clipping keeps streaming output in range
+            yield np.tanh(out * 0.35)
+
+    def _add_note(self, out, block_start, start, end, stop, note, family):
+        voice = voices[family]
+        a, b = max(start, block_start), min(stop, block_start + len(out))
+        t = np.arange(a - start, b - start, dtype=np.float32) / self.sample_rate
+        held = (end - start) / self.sample_rate
+        freq = 440.0 * 2 ** ((note['note'] - 69) / 12)
+        index = (t * (freq * wavetable_size)).astype(np.int64) & (wavetable_size - 1)
+        env = np.minimum(t / voice['attack'], 1.0)
+        if voice['decay']:
+            env *= np.exp(-voice['decay'] * np.minimum(t, held))
+        env *= np.clip(1.0 - (t - held) / voice['release'], 0.0, 1.0)
+        out[a - block_start:b - block_start] += self.tables[family][index] * env * (voice['gain'] * note['velocity'] / 127)
+
+
+def render_wav(tracks, tempo, path, ticks_per_beat=480, sample_rate=44100, block_size=65536):
+    """Render event-array tracks to a 16-bit mono WAV file; return its length in seconds."""
+    renderer = Renderer(sample_rate, block_size)
+    frames = 0
+    with wave.open(path, 'wb') as out:
+        out.setnchannels(1)
+        out.setsampwidth(2)
+        out.setframerate(sample_rate)
+        for block in renderer.blocks(note_table(tracks, tempo, ticks_per_beat)):
+            out.writeframes((block * 32767).astype('<i2').tobytes())
+            frames += len(block)
+    return frames / sample_rate
+
+
+def render_piece(mood, seed, path, bars=16, **kwargs):
+    """Generate one piece of ``mood`` and render it straight to WAV."""
+    tracks, _ = engine.compose_events(mood, seed, bars)
+    return render_wav(tracks, engine.mood_module(mood).tempo, path, **kwargs)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('source', help='a mood name or a .mid file to render')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--bars', type=int, default=16)
+    parser.add_argument('--sample-rate', type=int, default=44100)
+    parser.add_argument('--out', default=None)
+    args = parser.parse_args(argv)
+
+    if args.source in engine.moods:
+        out = args.out or f"{args.source}_{args.seed}.wav"
+        seconds = render_piece(args.source, args.seed, out, args.bars, sample_rate=args.sample_rate)
+    else:
+        out = args.out or os.path.splitext(args.source)[0] + '.wav'
+        tracks, tempo, ticks_per_beat = midi_file_tracks(args.source)
+        seconds = render_wav(tracks, tempo, out, ticks_per_beat, sample_rate=args.sample_rate)
+    print(f"Saved {out} ({seconds:.1f} s)")
+
+
+if __name__ == '__main__':
+    main()
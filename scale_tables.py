@@ -0,0 +1,67 @@
+"""Precompiled scale tables for the harmony and layer helpers.
+
+A ``ScaleTable`` holds a 128-entry in-scale mask for a scale spread over the
+low, middle and high registers, and one 128-entry map per interval that sends
+a note to ``note + interval`` when that lands in the scale and leaves it
+unchanged otherwise.  Deriving a harmony line is then a single fancy-indexing
+pass over the melody instead of a list scan per note.
+"""
+import functools
+
+import numpy as np
+
+# Intervals used by the harmony and complementary lines
+intervals = (-12, -5, -3, 0, 3, 4, 5, 7, 12)
+
+_notes = np.arange(128)
+
+# Octave layers: shift by an octave unless that leaves the 40..84 range
+octave_down = np.where(_notes - 12 >= 40, _notes - 12, _notes)
+octave_up = np.where(_notes + 12 <= 84, _notes + 12, _notes)
+
+
+class ScaleTable:
+    """In-scale mask and transpose maps for one scale in all three registers."""
+
+    def __init__(self, scale):
+        self.scale = tuple(scale)
+        self.mask = np.zeros(128, dtype=bool)
+        self.mask[[note + offset for offset in (-12, 0, 12) for note in scale]] = True
+        self.transpose = {interval: self._transpose_map(interval) for interval in intervals}
+        self._patterns = {}
+
+    def _transpose_map(self, interval):
+        shifted = _notes + interval
+        valid = (shifted >= 0) & (shifted < 128)
+        valid[valid] = self.mask[shifted[valid]]
+        return np.where(valid, shifted, _notes)
+
+    def pattern(self, pattern):
+        """Stack the maps for a repeating interval pattern into one table."""
+        pattern = tuple(pattern)
+        if pattern not in self._patterns:
+            for interval in pattern:
+                if interval not in self.transpose:
+                    self.transpose[interval] = self._transpose_map(interval)
+            self._patterns[pattern] = np.stack([self.transpose[interval] for interval in pattern])
+        return self._patterns[pattern]
+
+    def apply(self, melody, pattern, start=0):
+        """Transpose note ``i`` of ``melody`` by ``pattern[i % len(pattern)]`` where in scale.
+
+        ``melody`` may be 1-D or a 2-D batch of melodies.  ``start`` is the
+        index of its first note when it is one block of a longer melody.
+        """
+        table = self.pattern(pattern)
+        melody = np.asarray(melody)
+        return table[np.arange(start, start + melody.shape[-1]) % len(table), melody]
+
+
+@functools.lru_cache(maxsize=None)
+def _compile(scale):
+    return ScaleTable(scale)
+
+
+def compile_scale(scale):
+    """Return the (cached) ``ScaleTable`` for ``scale``."""
+    return _compile(tuple(scale))
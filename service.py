@@ -0,0 +1,323 @@
+"""Asyncio HTTP service that hands out generated pieces.
+
+    GET /piece?mood=happy|moody|energetic[&seed=N][&bars=N]
+    GET /metrics
+
+Requests without a seed (for the default length) are served from a per-mood
+pool of pieces generated ahead of time by worker processes; the response
+carries the piece's seed in ``X-Seed`` so it can be requested again.  Pieces
+with an explicit seed or length are generated on demand (or read from a
+``PieceCache`` when one is configured).
+
+When a pool is empty, requests wait for the next piece.  At most
+``max_waiting`` requests wait at once, and each waits at most
+``wait_timeout`` seconds; beyond that the service answers 503 with
+``Retry-After`` instead of queueing without bound.  ``/metrics`` reports
+latency percentiles, pool hit rate and pool levels as JSON.
+
+Seeded pieces are limited to ``max_bars`` bars (256 by default), since
+they are built in memory; ``streaming.py`` writes longer ones.  At most
+``max_generating`` on-demand pieces (one per worker by default) are
+generated at once.  A piece whose request timed out keeps running in the
+pool, so it still counts until it finishes.
+
+A failed generation is logged and retried.  If a worker process dies, the
+process pool is replaced, so the pools keep filling.  A request that fails
+for any other reason gets a 500 response.
+
+    python service.py --port 8000 --pool-size 64 --workers 4
+"""
+import argparse
+import asyncio
+import collections
+import itertools
+import json
+import logging
+import multiprocessing
+import os
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from urllib.parse import urlsplit, parse_qs
+
+import engine
+from cache import PieceCache
+
+log = logging.getLogger(__name__)
+
+reasons = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed',
+           500: 'Internal Server Error', 503: 'Service Unavailable'}
+
+
+class LatencyWindow:
+    """Latencies of the most recent requests, for percentile reporting."""
+
+    def __init__(self, size=10000):
+        self.samples = collections.deque(maxlen=size)
+
+    def record(self, seconds):
+        self.samples.append(seconds)
+
+    def percentiles(self, points=(50, 90, 99)):
+        ordered = sorted(self.samples)
+        if not ordered:
+            return {}
+        return {f"p{p}_ms": ordered[min(len(ordered) - 1, len(ordered) * p // 100)] * 1000 for p in points}
+
+
+class Busy(Exception):
+    """Raised when a request would have to queue beyond the configured limits."""
+
+
+class PieceService:
+    def __init__(self, pool_size=32, workers=None, fillers=2, bars=16, max_waiting=64, wait_timeout=5.0,
+                 cache=None, first_seed=None, retry_delay=1.0, max_bars=256, max_generating=None):
+        self.pool_size = pool_size
+        self.workers = workers or os.cpu_count() or 1
+        self.fillers = fillers
+        self.bars = bars
+        self.max_bars = max_bars
+        # On-demand jobs allowed in the process pool at once, counting those whose request timed out
+        self.max_generating = max_generating or self.workers
+        self.generating = 0
+        self.max_waiting = max_waiting
+        self.wait_timeout = wait_timeout
+        self.cache = cache
+        self.retry_delay = retry_delay
+        # Pool pieces get consecutive seeds from a random starting point
+        self.seeds = itertools.count(random.randrange(1 << 32) if first_seed is None else first_seed)
+        self.latency = LatencyWindow()
+        self.counters = collections.Counter()
+        self.waiting = 0
+        self.pools = {}
+        self.tasks = []
+        self.executor = None
+        self.server = None
+
+    def _new_executor(self):
+        # Workers fork from a forkserver with the generators preloaded.  Forking this
+        # process would leave every client socket open at the time in the worker.
+        context = multiprocessing.get_context('forkserver')
+        context.set_forkserver_preload(['engine'])
+        return ProcessPoolExecutor(max_workers=self.workers, mp_context=context)
+
+    async def start(self, host='127.0.0.1', port=8000):
+        self.executor = self._new_executor()
+        for mood in engine.moods:
+            self.pools[mood] = asyncio.Queue(maxsize=self.pool_size)
+            for _ in range(self.fillers):
+                self.tasks.append(asyncio.create_task(self._fill(mood)))
+        self.server = await asyncio.start_server(self._handle, host, port)
+        return self.server
+
+    async def close(self):
+        for task in self.tasks:
+            task.cancel()
+        if self.server is not None:
+            self.server.close()
+            await self.server.wait_closed()
+        if self.executor is not None:
+            self.executor.shutdown(cancel_futures=True)
+
+    async def _fill(self, mood):
+        # put() blocks while the pool is full, so filling pauses by itself
+        while True:
+            seed = next(self.seeds)
+            try:
+                data = await self._run(engine.generate_bytes, mood, seed, self.bars)
+            except Exception:
+                self.counters['fill_errors'] += 1
+                log.exception("filling the %s pool failed at seed %d", mood, seed)
+                await asyncio.sleep(self.retry_delay)
+                continue
+            await self.pools[mood].put((seed, data))
+
+    async def _run(self, function, *args, on_demand=False):
+        # Run in the process pool, replacing the pool when a worker has died
+        executor = self.executor
+        try:
+            future = executor.submit(function, *args)
+            if on_demand:
+                # A timed-out request leaves its job running, so count the job until it finishes
+                self.generating += 1
+                loop = asyncio.get_running_loop()
+                future.add_done_callback(lambda _: self._call_soon(loop, self._finished))
+            return await asyncio.wrap_future(future)
+        except BrokenProcessPool:
+            if self.executor is executor:
+                log.warning("a generator process died, starting a new pool")
+                self.counters['pool_restarts'] += 1
+                executor.shutdown(wait=False, cancel_futures=True)
+                self.executor = self._new_executor()
+            raise
+
+    @staticmethod
+    def _call_soon(loop, callback):
+        try:
+            loop.call_soon_threadsafe(callback)
+        except RuntimeError:
+            pass  # the loop closed while the job was still running
+
+    def _finished(self):
+        self.generating -= 1
+
+    async def _generate(self, mood, seed, bars):
+        # The cache only reads and writes files in a thread; generating is left to the process pool
+        loop = asyncio.get_running_loop()
+        if self.cache is not None:
+            data = await loop.run_in_executor(None, self.cache.cached_midi, mood, seed, bars)
+            if data is not None:
+                return data
+        if self.generating >= self.max_generating:
+            raise Busy()
+        data = await self._run(engine.generate_bytes, mood, seed, bars, on_demand=True)
+        if self.cache is not None:
+            await loop.run_in_executor(None, self.cache.store_midi, mood, seed, bars, data)
+        return data
+
+    async def _bounded(self, awaitable):
+        # Backpressure: cap how many requests may wait and for how long
+        if self.waiting >= self.max_waiting:
+            awaitable.close()
+            raise Busy()
+        self.waiting += 1
+        try:
+            return await asyncio.wait_for(awaitable, self.wait_timeout)
+        except asyncio.TimeoutError:
+            raise Busy() from None
+        finally:
+            self.waiting -= 1
+
+    async def piece(self, query):
+        """Return ``(status, headers, body)`` for a /piece request."""
+        try:
+            mood = query.get('mood', [''])[0]
+            engine.mood_module(mood)
+            seed = int(query['seed'][0]) if 'seed' in query else None
+            bars = int(query.get('bars', [self.bars])[0])
+            if not 1 <= bars <= self.max_bars:
+                raise ValueError(f"bars must be between 1 and {self.max_bars}")
+        except ValueError as e:
+            return 400, {'Content-Type': 'text/plain'}, str(e).encode()
+
+        try:
+            if seed is None and bars == self.bars:
+                pool = self.pools[mood]
+                if pool.empty():
+                    self.counters['pool_misses'] += 1
+                    seed, data = await self._bounded(pool.get())
+                else:
+                    self.counters['pool_hits'] += 1
+                    seed, data = pool.get_nowait()
+            else:
+                if seed is None:
+                    seed = next(self.seeds)
+                self.counters['on_demand'] += 1
+                data = await self._bounded(self._generate(mood, seed, bars))
+        except Busy:
+            self.counters['rejected'] += 1
+            return 503, {'Content-Type': 'text/plain', 'Retry-After': '1'}, b'busy, try again'
+        return 200, {'Content-Type': 'audio/midi', 'X-Seed': str(seed),
+                     'Content-Disposition': f'attachment; filename="{mood}_{seed}.mid"'}, data
+
+    def metrics(self):
+        hits, misses = self.counters['pool_hits'], self.counters['pool_misses']
+        return {
+            'requests': self.counters['requests'],
+            'pool_hits': hits,
+            'pool_misses': misses,
+            'pool_hit_rate': hits / (hits + misses) if hits + misses else None,
+            'on_demand': self.counters['on_demand'],
+            'rejected': self.counters['rejected'],
+            'errors': self.counters['errors'],
+            'fill_errors': self.counters['fill_errors'],
+            'pool_restarts': self.counters['pool_restarts'],
+            'waiting': self.waiting,
+            'generating': self.generating,
+            'pool_levels': {mood: pool.qsize() for mood, pool in self.pools.items()},
+            'latency': self.latency.percentiles(),
+        }
+
+    async def _handle(self, reader, writer):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b'\r\n', b'\n', b''):
+                        break
+                    name, _, value = line.decode('latin-1').partition(':')
+                    headers[name.strip().lower()] = value.strip()
+
+                start = time.perf_counter()
+                try:
+                    status, response_headers, body = await self._route(request_line.decode('latin-1').split())
+                except Exception:
+                    self.counters['errors'] += 1
+                    log.exception("request %r failed", request_line)
+                    status, response_headers, body = 500, {'Content-Type': 'text/plain'}, b'internal error'
+                keep_alive = headers.get('connection', '').lower() != 'close'
+                head = [f"HTTP/1.1 {status} {reasons[status]}", f"Content-Length: {len(body)}",
+                        f"Connection: {'keep-alive' if keep_alive else 'close'}"]
+                head += [f"{name}: {value}" for name, value in response_headers.items()]
+                writer.write(('\r\n'.join(head) + '\r\n\r\n').encode('latin-1') + body)
+                await writer.drain()
+                self.latency.record(time.perf_counter() - start)
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def _route(self, parts):
+        if len(parts) != 3:
+            return 400, {'Content-Type': 'text/plain'}, b'malformed request line'
+        method, target, _ = parts
+        if method != 'GET':
+            return 405, {'Allow': 'GET'}, b''
+        url = urlsplit(target)
+        self.counters['requests'] += 1
+        if url.path == '/piece':
+            return await self.piece(parse_qs(url.query))
+        if url.path == '/metrics':
+            return 200, {'Content-Type': 'application/json'}, json.dumps(self.metrics()).encode()
+        return 404, {'Content-Type': 'text/plain'}, b'not found'
+
+
+async def serve(host, port, **kwargs):
+    service = PieceService(**kwargs)
+    server = await service.start(host, port)
+    print(f"Serving on http://{host}:{port}/piece?mood=happy")
+    try:
+        await server.serve_forever()
+    finally:
+        await service.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--pool-size', type=int, default=32, help='ready pieces kept per mood')
+    parser.add_argument('--workers', type=int, default=None, help='generator processes')
+    parser.add_argument('--max-waiting', type=int, default=64, help='requests allowed to wait before 503')
+    parser.add_argument('--max-bars', type=int, default=256, help='longest piece served (streaming.py writes longer ones)')
+    parser.add_argument('--cache-dir', default=None, help='cache seeded pieces in this directory')
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(message)s')
+    cache = PieceCache(args.cache_dir) if args.cache_dir else None
+    try:
+        asyncio.run(serve(args.host, args.port, pool_size=args.pool_size, workers=args.workers,
+                          max_waiting=args.max_waiting, cache=cache, max_bars=args.max_bars))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
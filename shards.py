@@ -0,0 +1,367 @@
+"""Resumable batch generation split into shards, for runs across several machines.
+
+A job is planned once into a job directory on a filesystem all nodes share.
+The plan fixes every piece's mood, seed and length from its index alone, and
+cuts the pieces into shards of ``shard_size``.  Workers on any node claim
+whole shards by creating a lock file, write the shard's pieces and record
+each one in the shard's manifest.  The manifest is append-only and has one
+JSON line per piece: seed, mood, bars, instruments chosen, path and sha256.
+When a shard is finished it gets a ``.done`` marker.
+
+Only the lock holder appends to a shard's manifest.  That keeps appends
+safe on network filesystems where several writers to one file are not.
+A crashed worker leaves its lock behind.  The lock's modification time is
+refreshed after every piece, so once it is older than ``--stale-after``
+seconds another worker may break it.  That worker then resumes after the
+last piece the manifest records.  Pieces are written under a temporary name
+and renamed into place, so a path in the manifest is always a complete file.
+
+    python shards.py plan catalog --moods happy:2 moody energetic --count 100000 --bars 16 32
+    python shards.py work catalog --workers 8        # on every node
+    python shards.py status catalog
+    python shards.py manifest catalog > catalog/manifest.jsonl
+
+Run ``work`` again after a crash to finish the job.  With ``--workers`` each
+local process acts as its own node, which is how a multi-node run can be
+tried on one machine.
+"""
+import argparse
+import hashlib
+import json
+import os
+import random
+import socket
+import sys
+import tempfile
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+
+import engine
+import smf_writer
+
+
+def _write_atomic(path, data):
+    fd, temp_path = tempfile.mkstemp(prefix='.tmp', dir=os.path.dirname(path))
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, path)
+    except BaseException:
+        os.remove(temp_path)
+        raise
+
+
+def profile_hashes(moods):
+    """Map each distinct mood in ``moods`` to the hash of its profile settings."""
+    return {mood: engine.mood_module(mood).settings_hash for mood in sorted(set(moods))}
+
+
+def parse_mix(moods):
+    """Expand ``['happy:2', 'moody']`` into the repeating mood cycle ``['happy', 'happy', 'moody']``."""
+    cycle = []
+    for entry in moods:
+        mood, _, weight = entry.partition(':')
+        engine.mood_module(mood)
+        cycle.extend([mood] * int(weight or 1))
+    return cycle
+
+
+class Job:
+    """A planned job in ``directory``: its spec and the shard files beside it."""
+
+    def __init__(self, directory):
+        self.directory = directory
+        with open(os.path.join(directory, 'job.json')) as f:
+            self.spec = json.load(f)
+        self.count = self.spec['count']
+        self.shard_size = self.spec['shard_size']
+        self.shards = -(-self.count // self.shard_size)
+
+    @classmethod
+    def plan(cls, directory, moods, count, bars=(16, 16), start_seed=0, shard_size=500):
+        """Create the job in ``directory``, or open it if the same job is already planned there."""
+        mix = parse_mix(moods)
+        spec = {'moods': mix, 'count': count, 'bars': list(bars), 'start_seed': start_seed,
+                'shard_size': shard_size, 'version': engine.generator_version, 'profiles': profile_hashes(mix)}
+        os.makedirs(os.path.join(directory, 'shards'), exist_ok=True)
+        path = os.path.join(directory, 'job.json')
+        if os.path.exists(path):
+            cls(directory).check_generator()
+            with open(path) as f:
+                if json.load(f) != spec:
+                    raise ValueError(f"{directory} already holds a different job")
+        else:
+            _write_atomic(path, json.dumps(spec, indent=1).encode())
+        return cls(directory)
+
+    def check_generator(self):
+        """Raise ValueError unless this generator and these profiles make the pieces the job was planned with."""
+        if self.spec['version'] != engine.generator_version:
+            raise ValueError(f"job was planned with generator version {self.spec['version']}, "
+                             f"this is {engine.generator_version}; resuming would mix different output")
+        # Jobs planned before profiles were hashed have no 'profiles' to check
+        planned = self.spec.get('profiles', {})
+        changed = sorted(mood for mood, digest in profile_hashes(planned).items() if digest != planned[mood])
+        if changed:
+            raise ValueError(f"the {', '.join(changed)} profile changed since the job was planned; "
+                             f"resuming would mix different output")
+
+    def piece(self, index):
+        """Return ``(mood, seed, bars)`` of piece ``index``; depends on nothing but the spec."""
+        moods, (low, high) = self.spec['moods'], self.spec['bars']
+        seed = self.spec['start_seed'] + index
+        mood = moods[index % len(moods)]
+        # Drawn from its own stream so the length does not shift the piece's random choices
+        bars = low if low == high else random.Random(f"bars:{seed}").randint(low, high)
+        return mood, seed, bars
+
+    def shard_range(self, shard):
+        return range(shard * self.shard_size, min((shard + 1) * self.shard_size, self.count))
+
+    def shard_path(self, shard, suffix):
+        return os.path.join(self.directory, 'shards', f"{shard:05d}{suffix}")
+
+    def piece_path(self, shard, mood, seed, bars):
+        # Relative to the job directory, so the job can be moved or mounted elsewhere
+        return os.path.join('pieces', f"{shard:05d}", f"{mood}_{seed}_{bars}.mid")
+
+    def is_done(self, shard):
+        return os.path.exists(self.shard_path(shard, '.done'))
+
+    def records(self, shard):
+        """Return the manifest records of ``shard``, ignoring a line cut short by a crash."""
+        try:
+            with open(self.shard_path(shard, '.jsonl'), 'rb') as f:
+                lines = f.read().split(b'\n')
+        except FileNotFoundError:
+            return []
+        # Every complete record ends with a newline, so the last element is '' or a torn line
+        return [json.loads(line) for line in lines[:-1]]
+
+    def manifest(self):
+        """Yield the records of all shards in piece order, the latest one for each index."""
+        for shard in range(self.shards):
+            latest = {record['index']: record for record in self.records(shard)}
+            for index in sorted(latest):
+                yield latest[index]
+
+
+class ShardLock:
+    """Exclusive claim on one shard, held by creating its ``.lock`` file.
+
+    ``O_CREAT | O_EXCL`` is atomic on local filesystems and on NFSv3 or
+    later.  A lock older than ``stale_after`` seconds is broken by whoever
+    first creates the ``.break`` file named after the lock's token.  Only
+    one breaker can win for a given lock.
+    """
+
+    def __init__(self, job, shard, node):
+        self.job = job
+        self.shard = shard
+        self.path = job.shard_path(shard, '.lock')
+        self.token = f"{node}:{os.getpid()}:{uuid.uuid4().hex}"
+
+    def _create(self):
+        try:
+            fd = os.open(self.path, os.O_CREAT | os.O_EXCL | os.O_WRONLY, 0o644)
+        except FileExistsError:
+            return False
+        with os.fdopen(fd, 'w') as f:
+            f.write(self.token)
+        return True
+
+    def acquire(self, stale_after):
+        if self._create():
+            return True
+        try:
+            with open(self.path) as f:
+                token = f.read()
+            age = time.time() - os.stat(self.path).st_mtime
+        except FileNotFoundError:
+            return self._create()
+        if age < stale_after:
+            return False
+        try:
+            os.close(os.open(f"{self.path}.break-{hashlib.sha1(token.encode()).hexdigest()}",
+                             os.O_CREAT | os.O_EXCL | os.O_WRONLY, 0o644))
+        except FileExistsError:
+            return False  # another worker is already taking this shard over
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+        return self._create()
+
+    def held(self):
+        """Refresh the lock and return False if another worker has taken it over."""
+        try:
+            with open(self.path) as f:
+                if f.read() != self.token:
+                    return False
+            os.utime(self.path)
+        except FileNotFoundError:
+            return False
+        return True
+
+    def release(self):
+        if self.held():
+            os.remove(self.path)
+
+
+def generate_piece(mood, seed, bars):
+    """Return ``(data, choices)`` for one piece."""
+    tracks, choices = engine.compose_events(mood, seed, bars)
+    return smf_writer.encode_file(tracks, engine.mood_module(mood).tempo), choices
+
+
+def run_shard(job, shard, lock, verify=False):
+    """Generate the pieces of ``shard`` that its manifest does not list yet; return how many.
+
+    With ``verify`` the pieces already listed are re-read and any file that
+    is missing or does not match its checksum is generated again.
+    """
+    records = job.records(shard)
+    manifest_path = job.shard_path(shard, '.jsonl')
+    if os.path.exists(manifest_path):
+        # Drop a record torn by a crash so the next append starts on its own line
+        with open(manifest_path, 'r+b') as f:
+            data = f.read()
+            f.truncate(data.rfind(b'\n') + 1)
+    done = set()
+    for record in records:
+        if verify:
+            try:
+                with open(os.path.join(job.directory, record['path']), 'rb') as f:
+                    if hashlib.sha256(f.read()).hexdigest() != record['sha256']:
+                        continue
+            except FileNotFoundError:
+                continue
+        done.add(record['index'])
+
+    written = 0
+    os.makedirs(os.path.join(job.directory, 'pieces', f"{shard:05d}"), exist_ok=True)
+    with open(manifest_path, 'ab') as manifest:
+        for index in job.shard_range(shard):
+            if index in done:
+                continue
+            if not lock.held():
+                return written
+            mood, seed, bars = job.piece(index)
+            data, choices = generate_piece(mood, seed, bars)
+            path = job.piece_path(shard, mood, seed, bars)
+            _write_atomic(os.path.join(job.directory, path), data)
+            record = {'index': index, 'seed': seed, 'mood': mood, 'bars': bars, 'choices': choices,
+                      'path': path, 'bytes': len(data), 'sha256': hashlib.sha256(data).hexdigest()}
+            manifest.write(json.dumps(record).encode() + b'\n')
+            manifest.flush()
+            os.fsync(manifest.fileno())
+            written += 1
+    if lock.held():
+        _write_atomic(job.shard_path(shard, '.done'), b'')
+    return written
+
+
+def work(directory, node=None, stale_after=600.0, verify=False):
+    """Claim and finish shards of the job in ``directory`` until none are left; return pieces written.
+
+    Shards are tried from an offset derived from ``node``, so workers that
+    start together mostly try different shards first.
+    """
+    job = Job(directory)
+    job.check_generator()
+    node = node or socket.gethostname()
+    offset = int(hashlib.sha1(node.encode()).hexdigest(), 16) % max(1, job.shards)
+    written = 0
+    for step in range(job.shards):
+        shard = (offset + step) % job.shards
+        if job.is_done(shard):
+            continue
+        lock = ShardLock(job, shard, node)
+        if not lock.acquire(stale_after):
+            continue
+        try:
+            # Re-check under the lock: the previous holder may have just finished
+            if not job.is_done(shard):
+                written += run_shard(job, shard, lock, verify)
+        finally:
+            lock.release()
+    return written
+
+
+def work_locally(directory, workers, node=None, stale_after=600.0, verify=False):
+    """Run ``work`` in ``workers`` processes, each acting as a separate node."""
+    node = node or socket.gethostname()
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(work, directory, f"{node}-{i}", stale_after, verify) for i in range(workers)]
+        return sum(future.result() for future in futures)
+
+
+def status(directory, stale_after=600.0):
+    """Return counts of done, claimed and pending shards and of pieces recorded."""
+    job = Job(directory)
+    counts = {'shards': job.shards, 'done': 0, 'claimed': 0, 'stale_locks': 0, 'pending': 0, 'pieces': 0}
+    now = time.time()
+    for shard in range(job.shards):
+        counts['pieces'] += len({record['index'] for record in job.records(shard)})
+        if job.is_done(shard):
+            counts['done'] += 1
+            continue
+        try:
+            age = now - os.stat(job.shard_path(shard, '.lock')).st_mtime
+        except FileNotFoundError:
+            counts['pending'] += 1
+            continue
+        counts['claimed'] += 1
+        counts['stale_locks'] += age > stale_after
+    counts['count'] = job.count
+    return counts
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    commands = parser.add_subparsers(dest='command', required=True)
+    plan = commands.add_parser('plan', help='split a job into shards')
+    plan.add_argument('directory')
+    plan.add_argument('--moods', nargs='+', required=True, help='mood names, optionally weighted as mood:weight')
+    plan.add_argument('--count', type=int, required=True)
+    plan.add_argument('--bars', nargs=2, type=int, default=[16, 16], metavar=('MIN', 'MAX'))
+    plan.add_argument('--start-seed', type=int, default=0)
+    plan.add_argument('--shard-size', type=int, default=500)
+    run = commands.add_parser('work', help='claim and generate shards until the job is finished')
+    run.add_argument('directory')
+    run.add_argument('--workers', type=int, default=1)
+    run.add_argument('--node', default=None, help='name of this node in lock files (default: host name)')
+    run.add_argument('--stale-after', type=float, default=600.0, help='seconds before an idle lock may be broken')
+    run.add_argument('--verify', action='store_true', help='re-check recorded pieces against their checksums')
+    show = commands.add_parser('status', help='show progress')
+    show.add_argument('directory')
+    listing = commands.add_parser('manifest', help='print the merged manifest as JSON lines')
+    listing.add_argument('directory')
+    args = parser.parse_args(argv)
+
+    if args.command == 'plan':
+        try:
+            job = Job.plan(args.directory, args.moods, args.count, args.bars, args.start_seed, args.shard_size)
+        except ValueError as error:
+            parser.error(str(error))
+        print(f"Planned {job.count} pieces in {job.shards} shards in {args.directory}")
+    elif args.command == 'work':
+        start = time.perf_counter()
+        if args.workers > 1:
+            written = work_locally(args.directory, args.workers, args.node, args.stale_after, args.verify)
+        else:
+            written = work(args.directory, args.node, args.stale_after, args.verify)
+        print(f"Wrote {written} pieces in {time.perf_counter() - start:.1f}s")
+        print(json.dumps(status(args.directory, args.stale_after)))
+    elif args.command == 'status':
+        print(json.dumps(status(args.directory)))
+    else:
+        for record in Job(args.directory).manifest():
+            sys.stdout.write(json.dumps(record) + '\n')
+
+
+if __name__ == '__main__':
+    main()
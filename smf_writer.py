@@ -0,0 +1,203 @@
+"""Write Standard MIDI Files straight from compact event arrays.
+
+A track is an ``(n, 4)`` integer array of ``(delta, status, data1, data2)``
+rows holding channel messages only.  ``encode_track`` turns it into an MTrk
+chunk with VLQ delta times and running status in one vectorized pass, and
+``encode_file`` adds the MThd header.  The bytes are identical to what
+``mido`` writes for the same messages, so ``to_midi_file`` is only needed
+when a caller wants ``mido`` objects.  ``mido`` is imported only then, which
+keeps it off the startup path of the command line tools.
+"""
+import struct
+
+import numpy as np
+
+NOTE_OFF = 0x80
+NOTE_ON = 0x90
+PROGRAM_CHANGE = 0xC0
+
+END_OF_TRACK = b'\x00\xff\x2f\x00'
+
+
+def event_array(events):
+    """Return ``events`` (any sequence of 4-tuples) as an ``(n, 4)`` int64 array."""
+    return np.asarray(events, dtype=np.int64).reshape(-1, 4)
+
+
+def program_event(channel, program):
+    return event_array([(0, PROGRAM_CHANGE | channel, program, 0)])
+
+
+def note_events(channel, notes, velocities, on_deltas, off_deltas):
+    """Interleave a note_on/note_off pair per note into one event array."""
+    count = len(notes)
+    events = np.empty((2 * count, 4), dtype=np.int64)
+    events[0::2, 0] = on_deltas
+    events[0::2, 1] = NOTE_ON | channel
+    events[0::2, 2] = notes
+    events[0::2, 3] = velocities
+    events[1::2, 0] = off_deltas
+    events[1::2, 1] = NOTE_OFF | channel
+    events[1::2, 2] = notes
+    events[1::2, 3] = 0
+    return events
+
+
+def layer_events(notes, channels):
+    """Return one event array per row of a ``(layer, note)`` note array (see ``voices``)."""
+    layers, count = notes.shape
+    channels = np.asarray(channels, dtype=np.int64)[:, None]
+    events = np.empty((layers, 2 * count, 4), dtype=np.int64)
+    events[:, 0::2, 0] = notes['on_delta']
+    events[:, 0::2, 1] = NOTE_ON | channels
+    events[:, 0::2, 2] = notes['note']
+    events[:, 0::2, 3] = notes['velocity']
+    events[:, 1::2, 0] = notes['off_delta']
+    events[:, 1::2, 1] = NOTE_OFF | channels
+    events[:, 1::2, 2] = notes['note']
+    events[:, 1::2, 3] = 0
+    return list(events)
+
+
+def bpm2tempo(bpm):
+    # Microseconds per beat, rounded like mido.bpm2tempo
+    return int(round(60 * 1e6 / bpm))
+
+
+def tempo2bpm(tempo):
+    return 60 * 1e6 / tempo
+
+
+def tempo_meta(tempo):
+    # Delta 0, FF 51 03 and a 24-bit microseconds-per-beat value
+    return b'\x00\xff\x51\x03' + tempo.to_bytes(3, 'big')
+
+
+# Largest delta a 4-byte variable-length quantity can hold, as in the SMF spec
+max_delta = 0x0FFFFFFF
+
+
+def _check(events):
+    if len(events) and (events[:, 0].min() < 0 or events[:, 2:].min() < 0 or events[:, 2:].max() > 127):
+        raise ValueError('event delta must be non-negative and data bytes in 0..127')
+    if len(events) and events[:, 0].max() > max_delta:
+        raise ValueError('event delta does not fit in a 4-byte variable-length quantity')
+    kinds = events[:, 1] & 0xF0
+    if len(events) and (events[:, 1].max() > 0xEF or kinds.min() < 0x80):
+        raise ValueError('only channel messages can be written from event arrays')
+
+
+def encode_events(events, out=None, running_status=None):
+    """Encode the body of a track, returning a ``bytearray``.
+
+    When ``out`` (a writable buffer of exactly the right size) is given the
+    bytes are written into it instead.  Use ``encoded_size`` to size it.
+    ``running_status`` is the status byte in effect before the first event,
+    for encoding a track in several blocks.
+    """
+    events = np.asarray(events)
+    _check(events)
+    delta, status, data1, data2 = events[:, 0], events[:, 1], events[:, 2], events[:, 3]
+    vlq_len, running, two_data, offsets, total = _layout(delta, status, running_status)
+    if out is None:
+        out = bytearray(total)
+    if not total:
+        return out
+    buf = np.frombuffer(out, dtype=np.uint8, count=total)
+
+    # VLQ delta: most significant 7-bit group first, continuation bit on all but the last
+    for k in range(4):
+        has = vlq_len > k
+        shift = 7 * (vlq_len[has] - 1 - k)
+        more = np.where(vlq_len[has] - 1 > k, 0x80, 0)
+        buf[offsets[has] + k] = ((delta[has] >> shift) & 0x7F) | more
+    pos = offsets + vlq_len
+    buf[pos[~running]] = status[~running]
+    pos = pos + ~running
+    buf[pos] = data1
+    buf[pos[two_data] + 1] = data2[two_data]
+    return out
+
+
+def _layout(delta, status, running_status=None):
+    vlq_len = 1 + (delta >= 1 << 7) + (delta >= 1 << 14) + (delta >= 1 << 21)
+    running = np.zeros(len(status), dtype=bool)
+    running[1:] = status[1:] == status[:-1]
+    if len(status) and running_status is not None:
+        running[0] = status[0] == running_status
+    kind = status & 0xF0
+    two_data = (kind != 0xC0) & (kind != 0xD0)
+    sizes = vlq_len + ~running + 1 + two_data
+    offsets = np.zeros(len(sizes), dtype=np.int64)
+    np.cumsum(sizes[:-1], out=offsets[1:])
+    return vlq_len, running, two_data, offsets, int(sizes.sum())
+
+
+def encoded_size(events, running_status=None):
+    """Number of bytes ``encode_events`` produces for ``events``."""
+    events = np.asarray(events)
+    return _layout(events[:, 0], events[:, 1], running_status)[-1]
+
+
+def encode_track(events, tempo=None):
+    """Return a complete MTrk chunk, optionally starting with a set_tempo meta event."""
+    events = np.asarray(events)
+    prefix = tempo_meta(tempo) if tempo is not None else b''
+    size = encoded_size(events)
+    length = len(prefix) + size + len(END_OF_TRACK)
+    chunk = bytearray(8 + length)
+    chunk[:8] = b'MTrk' + struct.pack('>L', length)
+    chunk[8:8 + len(prefix)] = prefix
+    encode_events(events, memoryview(chunk)[8 + len(prefix):8 + len(prefix) + size])
+    chunk[-len(END_OF_TRACK):] = END_OF_TRACK
+    return chunk
+
+
+def file_header(track_count, ticks_per_beat=480):
+    # Always type 1, like a default mido.MidiFile
+    return b'MThd' + struct.pack('>Lhhh', 6, 1, track_count, ticks_per_beat)
+
+
+def encode_file(tracks, tempo=None, ticks_per_beat=480):
+    """Return the bytes of a Standard MIDI File holding ``tracks``.
+
+    Every track starts with a set_tempo meta event when ``tempo`` is given,
+    as the mood scripts write them.
+    """
+    data = bytearray(file_header(len(tracks), ticks_per_beat))
+    for events in tracks:
+        data += encode_track(events, tempo)
+    return bytes(data)
+
+
+def to_messages(events):
+    """Convert an event array to a list of ``mido.Message`` objects."""
+    from mido import Message
+
+    messages = []
+    for delta, status, data1, data2 in np.asarray(events).tolist():
+        kind, channel = status & 0xF0, status & 0x0F
+        if kind == NOTE_ON:
+            messages.append(Message('note_on', note=data1, velocity=data2, time=delta, channel=channel))
+        elif kind == NOTE_OFF:
+            messages.append(Message('note_off', note=data1, velocity=data2, time=delta, channel=channel))
+        elif kind == PROGRAM_CHANGE:
+            messages.append(Message('program_change', program=data1, time=delta, channel=channel))
+        else:
+            size = 2 if kind in (0xC0, 0xD0) else 3
+            messages.append(Message.from_bytes([status, data1, data2][:size], time=delta))
+    return messages
+
+
+def to_midi_file(tracks, tempo=None, ticks_per_beat=480):
+    """Build a ``mido.MidiFile`` equivalent to ``encode_file(tracks, tempo)``."""
+    from mido import MetaMessage, MidiFile, MidiTrack
+
+    mid = MidiFile(ticks_per_beat=ticks_per_beat)
+    for events in tracks:
+        track = MidiTrack()
+        if tempo is not None:
+            track.append(MetaMessage('set_tempo', tempo=tempo))
+        track.extend(to_messages(events))
+        mid.tracks.append(track)
+    return mid
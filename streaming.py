@@ -0,0 +1,168 @@
+"""Generate arbitrarily long pieces with memory that does not grow with length.
+
+``write_long_piece`` pulls the main melody lazily from the mood's
+``melody_segments`` generator, a block of segments at a time, derives the
+layered tracks for that block and appends each track's encoded events to
+its own temporary MTrk spool.  When the melody is finished the chunk
+lengths are patched into the spools and they are copied into the output
+file after the MThd header.  Memory use depends on ``block_notes``, not on
+the number of bars:
+
+    python streaming.py moody --bars 100000 --seed 1 --out ambient.mid
+
+Each track draws from its own random stream (derived from the seed) so the
+tracks can be produced block by block.  A streamed piece is therefore
+reproducible from its seed but is not the same piece ``engine.generate``
+returns for that seed.
+"""
+import argparse
+import os
+import random
+import shutil
+import struct
+import tempfile
+
+import numpy as np
+
+import engine
+import scale_tables
+import smf_writer
+from mood_profiles import track_names
+
+
+class TrackSpool:
+    """One MTrk chunk written to a temporary file as blocks of events arrive."""
+
+    def __init__(self, directory, tempo):
+        self.file = tempfile.TemporaryFile(dir=directory)
+        # Length is a placeholder until finish(); the tempo meta event resets running status
+        self.file.write(b'MTrk\x00\x00\x00\x00' + smf_writer.tempo_meta(tempo))
+        self.running_status = None
+
+    def append(self, events):
+        if not len(events):
+            return
+        self.file.write(smf_writer.encode_events(events, running_status=self.running_status))
+        self.running_status = int(events[-1, 1])
+
+    def finish(self):
+        """Close the chunk, patch its length and rewind the spool for copying."""
+        self.file.write(smf_writer.END_OF_TRACK)
+        length = self.file.tell() - 8
+        self.file.seek(4)
+        self.file.write(struct.pack('>L', length))
+        self.file.seek(0)
+        return self.file
+
+    def close(self):
+        self.file.close()
+
+
+def _melody_blocks(module, total_notes, registers, rng, block_notes):
+    # Group the endless segment generator into blocks of about block_notes notes
+    block = []
+    produced = 0
+    for segment in module.melody_segments(None, 6, registers, rng):
+        block.extend(segment)
+        if len(block) >= block_notes or produced + len(block) >= total_notes:
+            block = block[:total_notes - produced]
+            yield block
+            produced += len(block)
+            block = []
+            if produced >= total_notes:
+                return
+
+
+def piece_blocks(mood, seed, bars, block_notes=4096):
+    """Return ``(choices, blocks)`` for a streamed piece.
+
+    ``blocks`` is a generator of lists holding one event array per track (in
+    ``track_names`` order); concatenating them track by track gives the
+    whole piece.
+    """
+    module = engine.mood_module(mood)
+    rng = random.Random(seed)
+    main_instr_name, main_instr_prog = rng.choice(list(module.main_instruments.items()))
+    background_instr_name, background_instr_prog = rng.choice(list(module.background_instruments.items()))
+    choices = {'main': main_instr_name, 'background': background_instr_name}
+    scale_name, registers, table = module.pick_scale(rng)
+    if scale_name is not None:
+        choices['scale'] = scale_name
+    # One stream for the melody, one for percussion and one per note track
+    melody_rng, percussion_rng = random.Random(rng.getrandbits(64)), random.Random(rng.getrandbits(64))
+    note_rngs = {name: random.Random(rng.getrandbits(64)) for name in track_names if name != 'percussion'}
+    programs = {'main': main_instr_prog, 'main2': main_instr_prog, 'main3': main_instr_prog,
+                'background': background_instr_prog, 'second': main_instr_prog}
+
+    def blocks():
+        empty = np.zeros((0, 4), dtype=np.int64)
+        opening = []
+        for name in track_names:
+            if name == 'percussion':
+                opening.append(module.percussion_events(module.percussion_bars, percussion_rng))
+            elif name in module.program_tracks:
+                opening.append(smf_writer.program_event(module.channels[name], programs[name]))
+            else:
+                opening.append(empty)
+        yield opening
+
+        start = 0
+        total_notes = bars * module.notes_per_bar
+        for melody in _melody_blocks(module, total_notes, registers, melody_rng, block_notes):
+            voices = {
+                'main': melody,
+                'main2': scale_tables.octave_down[melody],
+                'main3': scale_tables.octave_up[melody],
+                'background': module.generate_background_melody(melody, table, start),
+                'second': module.generate_complementary_melody(melody, table, start),
+            }
+            block = []
+            for name in track_names:
+                if name == 'percussion':
+                    block.append(empty)
+                    continue
+                timings = module.note_timings(len(melody), name != 'background', note_rngs[name], start)
+                block.append(smf_writer.note_events(module.channels[name], voices[name], *timings))
+            yield block
+            start += len(melody)
+
+    return choices, blocks()
+
+
+def write_long_piece(path, mood, seed, bars, block_notes=4096):
+    """Stream a piece of ``bars`` bars to ``path``; return the random choices made."""
+    module = engine.mood_module(mood)
+    # Spool next to the output so the final copy stays on one filesystem
+    directory = os.path.dirname(os.path.abspath(path))
+    choices, blocks = piece_blocks(mood, seed, bars, block_notes)
+    spools = [TrackSpool(directory, module.tempo) for _ in track_names]
+    try:
+        for block in blocks:
+            for spool, events in zip(spools, block):
+                spool.append(events)
+        with open(path, 'wb') as out:
+            out.write(smf_writer.file_header(len(spools)))
+            for spool in spools:
+                shutil.copyfileobj(spool.finish(), out, 1 << 20)
+    finally:
+        for spool in spools:
+            spool.close()
+    return choices
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('mood', choices=sorted(engine.moods))
+    parser.add_argument('--bars', type=int, default=1000)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--out', default=None)
+    args = parser.parse_args(argv)
+
+    out = args.out or f"{args.mood}_{args.seed}_{args.bars}bars.mid"
+    choices = write_long_piece(out, args.mood, args.seed, args.bars)
+    print(', '.join(f"{key}: {value}" for key, value in choices.items()))
+    print(f"Saved {out}")
+
+
+if __name__ == '__main__':
+    main()
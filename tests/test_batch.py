@@ -0,0 +1,22 @@
+import os
+
+import batch
+import dedup
+
+
+def test_retry_seeds_never_meet_primary_seeds():
+    seeds = {batch.retry_seed(seed, attempt) for seed in range(1000) for attempt in range(1, 10)}
+    assert len(seeds) == 9000
+    assert min(seeds) >= 1 << 63
+
+
+def test_regenerated_pieces_are_named_by_their_seed(tmp_path):
+    index = dedup.MelodyLSH()
+    first = batch.generate_batch(['happy'], 6, str(tmp_path / 'a'), bars=8, workers=1, dedup_index=index)
+    # The same seeds again are all near-duplicates, so every slot is regenerated
+    second = batch.generate_batch(['happy'], 6, str(tmp_path / 'b'), bars=8, workers=1, dedup_index=index)
+    assert index.rejected == 6
+    names = {os.path.basename(path) for path in first}
+    seeds = [int(os.path.basename(path)[len('happy_'):-len('.mid')]) for path in second]
+    assert len(second) == 6 and not names & {os.path.basename(path) for path in second}
+    assert [seed for seed in seeds if seed < 1 << 63] == []
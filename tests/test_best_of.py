@@ -0,0 +1,22 @@
+import numpy as np
+import pytest
+
+import best_of
+import engine
+
+
+@pytest.mark.parametrize('mood', sorted(engine.moods))
+def test_every_component_varies_across_seeds(mood):
+    features = [best_of.candidate_features(mood, seed, 8) for seed in range(12)]
+    scores, components = best_of.score_candidates(*(np.stack(column) for column in zip(*features)))
+    assert set(components) == set(best_of.weights)
+    for name, values in components.items():
+        assert values.min() < values.max(), name
+    assert len(np.unique(scores)) > 1
+
+
+def test_winner_regenerates_from_its_seed():
+    data, result = best_of.best_piece('happy', 7, bars=8, candidates=4)
+    assert result['seed'] in best_of.candidate_seeds(7, 4)
+    assert result['score'] == max(result['scores'])
+    assert data == engine.generate_bytes('happy', result['seed'], 8)
@@ -0,0 +1,50 @@
+import os
+
+import cache
+
+
+def store(piece_cache, key, size):
+    def write(path):
+        with open(path, 'wb') as f:
+            f.write(b'x' * size)
+
+    return piece_cache.store(key, '.bin', write)
+
+
+def age(path, seconds):
+    os.utime(path, (seconds, seconds))
+
+
+def test_hits_and_misses_are_counted(tmp_path):
+    piece_cache = cache.PieceCache(str(tmp_path))
+    first = piece_cache.midi('happy', 1, 2)
+    assert piece_cache.midi('happy', 1, 2) == first
+    assert (piece_cache.hits, piece_cache.misses) == (1, 1)
+    assert piece_cache.stats()['bytes'] == len(first)
+
+
+def test_lookup_refreshes_a_file_so_it_is_evicted_last(tmp_path):
+    piece_cache = cache.PieceCache(str(tmp_path), max_bytes=300, low_water=0.75)
+    paths = {key: store(piece_cache, key, 100) for key in ('aa', 'bb', 'cc')}
+    for when, key in enumerate(('aa', 'bb', 'cc')):
+        age(paths[key], 1000 + when)
+    # 'aa' is the oldest until it is used again
+    assert piece_cache.lookup('aa', '.bin') == paths['aa']
+    newest = store(piece_cache, 'dd', 100)
+    assert [os.path.exists(paths[key]) for key in ('aa', 'bb', 'cc')] == [True, False, False]
+    assert os.path.exists(newest)
+    assert piece_cache.evictions == 2 and piece_cache.size == 200
+
+
+def test_file_larger_than_the_limit_is_kept(tmp_path):
+    piece_cache = cache.PieceCache(str(tmp_path), max_bytes=100)
+    small = store(piece_cache, 'aa', 50)
+    age(small, 1000)
+    large = store(piece_cache, 'bb', 500)
+    assert os.path.exists(large) and not os.path.exists(small)
+    assert piece_cache.lookup('bb', '.bin') == large
+
+
+def test_cache_size_is_found_again_on_open(tmp_path):
+    store(cache.PieceCache(str(tmp_path)), 'aa', 70)
+    assert cache.PieceCache(str(tmp_path)).size == 70
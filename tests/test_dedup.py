@@ -0,0 +1,35 @@
+import numpy as np
+
+import dedup
+
+
+def test_rows_are_found_before_and_after_a_merge():
+    rng = np.random.default_rng(0)
+    index = dedup.MelodyLSH()
+    signatures = rng.integers(0, 2 ** 32, (5000, 64), dtype=np.uint32)
+    index.add_many([f"p{i}" for i in range(4000)], signatures[:4000])
+    assert index._merged == 0
+    for i in range(4000, 5000):
+        index.add(f"p{i}", signatures[i])
+    assert 0 < index._merged < len(index)
+    for i in (0, 3999, 4095, 4096, 4999):
+        assert index.query(signatures[i])[0] == (f"p{i}", 1.0)
+
+
+def test_the_unsorted_tail_stays_bounded():
+    rng = np.random.default_rng(1)
+    index = dedup.MelodyLSH()
+    for i, signature in enumerate(rng.integers(0, 2 ** 32, (20000, 64), dtype=np.uint32)):
+        index.add(f"p{i}", signature)
+        assert len(index) - index._merged <= max(4096, index._merged // 4)
+    assert sum(len(rows) for rows in index._tail[0].values()) == len(index) - index._merged
+
+
+def test_saved_index_loads_merged(tmp_path):
+    melody = [60, 62, 64, 65, 67, 69, 71, 72, 71, 69, 67]
+    index = dedup.MelodyLSH()
+    index.add('a', index.hasher.melody_signature(melody))
+    index.save(str(tmp_path / 'index.npz'))
+    loaded = dedup.MelodyLSH.load(str(tmp_path / 'index.npz'))
+    assert loaded._merged == 1
+    assert loaded.query(loaded.hasher.melody_signature([note + 5 for note in melody])) == [('a', 1.0)]
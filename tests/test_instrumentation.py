@@ -0,0 +1,18 @@
+import engine
+import instrumentation
+
+
+def test_each_stage_is_timed_once_per_piece():
+    with instrumentation.recording() as recorder:
+        for seed in range(3):
+            engine.generate_bytes('happy', seed, 4)
+    assert {name: calls for name, (calls, _, _) in recorder.stages.items()} == dict.fromkeys(
+        ['melody', 'harmony', 'notes', 'events', 'percussion', 'encode'], 3)
+    assert recorder.counters['notes'] > 0
+
+
+def test_nothing_is_recorded_when_off():
+    assert instrumentation.counters() is None
+    with instrumentation.stage('melody'):
+        pass
+    assert instrumentation.current is None
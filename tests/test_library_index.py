@@ -0,0 +1,44 @@
+import os
+
+import engine
+import library_index
+
+
+def generations(directory):
+    return sorted(name for name in os.listdir(directory) if name.startswith('gen-'))
+
+
+def test_previous_generation_outlives_one_update(tmp_path):
+    catalog, directory = tmp_path / 'catalog', str(tmp_path / 'index')
+    catalog.mkdir()
+    index = library_index.LibraryIndex(directory)
+    for seed in range(3):
+        (catalog / f"happy_{seed}.mid").write_bytes(engine.generate_bytes('happy', seed, 2))
+        index.update(str(catalog), workers=1)
+    # A reader that read the pointer before the last update still finds its columns
+    reader = library_index.LibraryIndex(directory)
+    first, second = generations(directory)
+    assert open(os.path.join(directory, 'current')).read() == second
+    assert len(reader) == 3 and reader.root == str(catalog)
+    assert os.path.exists(os.path.join(directory, first, 'path.npy'))
+
+
+def test_load_retries_when_its_generation_disappears(tmp_path, monkeypatch):
+    catalog, directory = tmp_path / 'catalog', str(tmp_path / 'index')
+    catalog.mkdir()
+    (catalog / 'happy_0.mid').write_bytes(engine.generate_bytes('happy', 0, 2))
+    library_index.LibraryIndex(directory).update(str(catalog), workers=1)
+    load = library_index.np.load
+    calls = []
+
+    def removed_once(path, *args, **kwargs):
+        # The first load loses the race with two updates that removed its generation
+        calls.append(path)
+        if len(calls) == 1:
+            raise FileNotFoundError(path)
+        return load(path, *args, **kwargs)
+
+    monkeypatch.setattr(library_index.np, 'load', removed_once)
+    reader = library_index.LibraryIndex(directory)
+    assert len(reader) == 1
+    assert len(calls) == 1 + len(library_index.columns)
@@ -0,0 +1,52 @@
+import asyncio
+
+import numpy as np
+import pytest
+
+import live
+from event_buffer import EventBuffer
+
+
+def short_schedule(mood, seed, bars=16):
+    if mood == 'broken':
+        raise ValueError('generation failed')
+    events = EventBuffer([[0, 0x90, 60 + seed, 64], [0, 0x80, 60 + seed, 0]])
+    return np.array([0.0, 0.01]), events, 0.02
+
+
+@pytest.fixture
+def sink(monkeypatch):
+    monkeypatch.setattr(live, 'piece_schedule', short_schedule)
+    return live.MemorySink()
+
+
+def play(sink, jobs):
+    return asyncio.run(live.Scheduler(sink, lookahead=0.01).run(iter(jobs), None))
+
+
+def sent_notes(sink):
+    return [message[1] for _, message in sink.messages if message[0] == 0x90]
+
+
+def test_plays_every_piece_in_order(sink):
+    stats = play(sink, [('happy', 0, 1), ('happy', 1, 1)])
+    assert stats['events'] == 4
+    assert sent_notes(sink) == [60, 61]
+
+
+def test_generation_error_reaches_the_caller(sink):
+    with pytest.raises(ValueError, match='generation failed'):
+        asyncio.run(asyncio.wait_for(live.Scheduler(sink, lookahead=0.01).run(iter([('broken', 0, 1)]), None), 5))
+    # All notes off is still sent on the way out
+    assert [message for _, message in sink.messages] == [[0xB0 | channel, 123, 0] for channel in range(16)]
+
+
+def test_queued_pieces_play_before_the_error(sink):
+    with pytest.raises(ValueError):
+        play(sink, [('happy', 0, 1), ('broken', 0, 1), ('happy', 2, 1)])
+    assert sent_notes(sink) == [60]
+
+
+def test_unknown_mood_is_rejected(sink):
+    with pytest.raises(ValueError, match='unknown mood'):
+        asyncio.run(live.stream('nosuch', sink, pieces=1))
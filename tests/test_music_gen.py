@@ -0,0 +1,42 @@
+import os
+import signal
+import stat
+import subprocess
+import sys
+import time
+
+import pytest
+
+import music_gen
+
+script = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'music_gen.py')
+
+
+@pytest.fixture
+def daemon(tmp_path):
+    socket_path = str(tmp_path / 'music-gen.sock')
+    process = subprocess.Popen([sys.executable, script, 'serve', '--socket', socket_path], stdout=subprocess.DEVNULL)
+    deadline = time.monotonic() + 30
+    while music_gen.request(socket_path, 'ping', 0, 0, '', timeout=1.0) is None:
+        assert process.poll() is None and time.monotonic() < deadline
+        time.sleep(0.05)
+    yield socket_path
+    process.send_signal(signal.SIGTERM)
+    process.wait(10)
+    assert not os.path.exists(socket_path)
+
+
+def test_daemon_socket_is_owner_only(daemon):
+    assert stat.S_IMODE(os.stat(daemon).st_mode) == 0o600
+
+
+def test_daemon_writes_the_same_piece(daemon, tmp_path):
+    ok, text = music_gen.request(daemon, 'moody', 4, 8, str(tmp_path / 'warm.mid'))
+    assert ok and 'Main instrument' in text
+    music_gen.generate('moody', 4, 8, str(tmp_path / 'cold.mid'))
+    assert (tmp_path / 'warm.mid').read_bytes() == (tmp_path / 'cold.mid').read_bytes()
+
+
+def test_parse_args_falls_back_for_unknown_flags():
+    assert music_gen.parse_args(['happy', '--seed', '3', '--out=x.mid'])['out'] == 'x.mid'
+    assert music_gen.parse_args(['happy', '--tempo', '3']) is None
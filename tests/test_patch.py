@@ -0,0 +1,47 @@
+import pytest
+
+import engine
+import patch
+import smf_writer
+
+
+@pytest.fixture
+def catalog(tmp_path):
+    for seed in range(3):
+        (tmp_path / f"happy_{seed}.mid").write_bytes(engine.generate_bytes('happy', seed, 2))
+    (tmp_path / 'broken.mid').write_bytes(b'not midi')
+    return tmp_path
+
+
+def test_tempo_is_changed_in_place(catalog):
+    counts = patch.patch_directory(str(catalog), bpm=80)
+    assert counts['patched'] == 3
+    assert counts['errors'] == [('broken.mid', 'not a Standard MIDI File')]
+    tempos, _ = patch.patch_points((catalog / 'happy_0.mid').read_bytes())
+    data = (catalog / 'happy_0.mid').read_bytes()
+    assert int.from_bytes(data[tempos[0]:tempos[0] + 3], 'big') == 750000
+
+
+def test_non_positive_tempo_is_reported_by_name(catalog):
+    before = (catalog / 'happy_1.mid').read_bytes()
+    counts = patch.patch_directory(str(catalog), bpm_delta=-1000)
+    assert counts['failed'] == 4
+    assert ('happy_1.mid', 'a tempo of 110 bpm would drop to -890 bpm') in counts['errors']
+    assert (catalog / 'happy_1.mid').read_bytes() == before
+
+
+@pytest.mark.parametrize('bpm', ['0', '-5'])
+def test_cli_rejects_non_positive_bpm(catalog, bpm):
+    with pytest.raises(SystemExit) as exit_info:
+        patch.main([str(catalog), '--bpm', bpm])
+    assert exit_info.value.code == 2
+
+
+def test_program_changes_under_running_status_are_patched():
+    body = bytes([0x00, 0xC0, 0x05, 0x00, 0x90, 0x3C, 0x40, 0x10, 0xC0, 0x07, 0x00, 0x0A, 0x00, 0x09])
+    body += smf_writer.END_OF_TRACK
+    buffer = bytearray(smf_writer.file_header(1) + b'MTrk' + len(body).to_bytes(4, 'big') + body)
+    _, programs = patch.patch_points(buffer)
+    assert len(programs) == 4
+    assert patch.patch_buffer(buffer, programs={0: 40}) == 4
+    assert [buffer[offset] for offset, _ in programs] == [40] * 4
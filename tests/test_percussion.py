@@ -0,0 +1,27 @@
+import random
+
+import numpy as np
+
+from percussion import Groove
+
+
+def hit_ticks(events, note):
+    ticks = np.cumsum(events[:, 0])
+    return ticks[(events[:, 1] == 0x99) & (events[:, 2] == note)].tolist()
+
+
+def test_skipped_hits_keep_the_later_hits_in_place():
+    groove = Groove([(36, 80, 480, 120), (42, 40, 240, 60, 0.0), (38, 70, 0, 120)], 9)
+    events = groove.events(4, random.Random(1))
+    assert hit_ticks(events, 42) == []
+    # Without the hi-hat, each bar is the kick, the hi-hat's delay and the snare
+    bar = 120 + 240 + 120 + 480
+    assert hit_ticks(events, 38) == [120 + 240 + bar * i for i in range(4)]
+
+
+def test_optional_hits_play_by_probability():
+    groove = Groove([(36, (60, 90), 0, 240), (46, 50, 0, 240, 0.5)], 9)
+    events = groove.events(400, random.Random(2))
+    assert 100 < len(hit_ticks(events, 46)) < 300
+    velocities = events[(events[:, 1] == 0x99) & (events[:, 2] == 36), 3]
+    assert velocities.min() >= 60 and velocities.max() <= 90
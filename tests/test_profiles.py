@@ -0,0 +1,37 @@
+import copy
+
+import pytest
+
+import cache
+import engine
+import mood_profiles
+import shards
+
+
+@pytest.fixture
+def edited_happy(monkeypatch):
+    settings = copy.deepcopy(engine.moods['happy'].settings)
+    settings['bpm'] += 1
+    monkeypatch.setitem(engine.moods, 'happy', mood_profiles.MoodProfile('happy', settings))
+
+
+def test_settings_hash_ignores_key_order():
+    settings = engine.moods['moody'].settings
+    reordered = dict(reversed(list(settings.items())))
+    assert mood_profiles.MoodProfile('moody', reordered).settings_hash == engine.moods['moody'].settings_hash
+
+
+def test_cache_key_changes_with_the_profile(request):
+    before = cache.cache_key('mid', 'happy', 1, bars=16)
+    request.getfixturevalue('edited_happy')
+    assert cache.cache_key('mid', 'happy', 1, bars=16) != before
+    assert cache.cache_key('mid', 'moody', 1, bars=16) == cache.cache_key('mid', 'moody', 1, bars=16)
+
+
+def test_job_refuses_to_resume_after_a_profile_edit(tmp_path, request):
+    shards.Job.plan(str(tmp_path), ['happy', 'moody'], 4, (2, 2), shard_size=2)
+    request.getfixturevalue('edited_happy')
+    with pytest.raises(ValueError, match='happy profile changed'):
+        shards.work(str(tmp_path), 'node')
+    with pytest.raises(ValueError, match='happy profile changed'):
+        shards.Job.plan(str(tmp_path), ['happy', 'moody'], 4, (2, 2), shard_size=2)
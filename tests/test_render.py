@@ -0,0 +1,38 @@
+import numpy as np
+
+import engine
+import render
+
+
+def table(*tracks):
+    return render.note_table([np.array(track, dtype=np.int64).reshape(-1, 4) for track in tracks], 480000, 480)
+
+
+def test_overlapping_notes_of_one_pitch_end_first_in_first_out():
+    notes = table([[0, 0x90, 60, 100], [10, 0x90, 60, 90], [10, 0x80, 60, 0], [10, 0x90, 60, 0]])
+    assert notes[['note', 'velocity']].tolist() == [(60, 100), (60, 90)]
+    assert np.allclose(notes['start'], [0, 0.01]) and np.allclose(notes['end'], [0.02, 0.03])
+
+
+def test_unmatched_note_offs_and_open_notes_are_dropped():
+    notes = table([[0, 0x80, 62, 0], [0, 0x91, 62, 80], [5, 0x91, 64, 80], [5, 0x81, 62, 0], [5, 0x81, 62, 0]])
+    assert notes[['note', 'channel']].tolist() == [(62, 1)]
+
+
+def test_programs_carry_across_tracks():
+    notes = table([[0, 0xC2, 40, 0]], [[0, 0x92, 60, 64], [5, 0x82, 60, 0], [0, 0xC2, 7, 0], [0, 0x92, 61, 64],
+                                       [5, 0x82, 61, 0]])
+    assert notes['program'].tolist() == [40, 7]
+
+
+def test_every_generated_note_is_paired():
+    tracks, _ = engine.compose_events('energetic', 2, 4)
+    notes = render.note_table(tracks, 500000)
+    note_ons = sum(int(((events[:, 1] & 0xF0 == 0x90) & (events[:, 3] > 0)).sum()) for events in tracks)
+    assert len(notes) == note_ons
+    assert np.all(np.diff(notes['start']) >= 0) and np.all(notes['end'] >= notes['start'])
+
+
+def test_render_writes_the_whole_piece(tmp_path):
+    seconds = render.render_piece('moody', 1, str(tmp_path / 'piece.wav'), 2, sample_rate=8000, block_size=1000)
+    assert seconds > 0 and (tmp_path / 'piece.wav').stat().st_size == 44 + 2 * round(seconds * 8000)
@@ -0,0 +1,106 @@
+import asyncio
+import os
+import signal
+
+import service
+
+
+async def get(port, target):
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    writer.write(f"GET {target} HTTP/1.1\r\nConnection: close\r\n\r\n".encode())
+    response = await reader.read()
+    writer.close()
+    head, _, body = response.partition(b'\r\n\r\n')
+    return int(head.split()[1]), body
+
+
+def run(scenario, **options):
+    async def main():
+        piece_service = service.PieceService(pool_size=2, workers=1, fillers=1, bars=1, retry_delay=0.05, **options)
+        server = await piece_service.start(port=0)
+        try:
+            return await asyncio.wait_for(scenario(piece_service, server.sockets[0].getsockname()[1]), 30)
+        finally:
+            await piece_service.close()
+
+    return asyncio.run(main())
+
+
+def test_pool_and_seeded_pieces():
+    async def scenario(piece_service, port):
+        pooled = await get(port, '/piece?mood=happy')
+        seeded = await get(port, '/piece?mood=happy&seed=3&bars=1')
+        return pooled, seeded, await get(port, '/piece?mood=nosuch')
+
+    pooled, seeded, bad = run(scenario)
+    assert pooled[0] == 200 and pooled[1].startswith(b'MThd')
+    assert seeded[0] == 200 and seeded[1].startswith(b'MThd')
+    assert bad[0] == 400
+
+
+def test_pools_refill_after_a_worker_dies():
+    async def scenario(piece_service, port):
+        while piece_service.pools['happy'].qsize() < 2:
+            await asyncio.sleep(0.01)
+        broken = piece_service.executor
+        for process in list(broken._processes.values()):
+            os.kill(process.pid, signal.SIGKILL)
+        # Taking pieces wakes the filler, whose next job finds the dead pool
+        while piece_service.executor is broken:
+            assert (await get(port, '/piece?mood=happy'))[0] == 200
+        # More pieces than the pool held, so some come from the new processes
+        return [await get(port, '/piece?mood=happy') for _ in range(4)], piece_service.counters
+
+    responses, counters = run(scenario)
+    assert all(status == 200 and body.startswith(b'MThd') for status, body in responses)
+    assert counters['pool_restarts'] == 1
+
+
+class FailingCache:
+    def cached_midi(self, mood, seed, bars):
+        raise RuntimeError('disk on fire')
+
+
+def test_unexpected_errors_get_a_500():
+    async def scenario(piece_service, port):
+        failed = await get(port, '/piece?mood=happy&seed=1')
+        # The connection handler survives, so the service keeps answering
+        return failed, await get(port, '/metrics')
+
+    (status, _), (metrics_status, _) = run(scenario, cache=FailingCache())
+    assert status == 500
+    assert metrics_status == 200
+
+
+def test_cached_pieces_are_generated_once(tmp_path):
+    cache = service.PieceCache(str(tmp_path))
+
+    async def scenario(piece_service, port):
+        return [await get(port, '/piece?mood=moody&seed=5&bars=1') for _ in range(2)]
+
+    first, second = run(scenario, cache=cache)
+    assert first == second and first[0] == 200
+    assert cache.cached_midi('moody', 5, 1) == first[1]
+
+
+def test_long_pieces_are_refused():
+    async def scenario(piece_service, port):
+        return await get(port, '/piece?mood=happy&seed=1&bars=257')
+
+    status, body = run(scenario)
+    assert status == 400 and b'256' in body
+
+
+def test_timed_out_jobs_still_occupy_a_worker():
+    async def scenario(piece_service, port):
+        slow = await get(port, '/piece?mood=happy&seed=1&bars=3000')
+        # The slow piece is still being generated, so there is no worker for another
+        busy = await get(port, '/piece?mood=happy&seed=2&bars=1')
+        still_running = piece_service.generating
+        while piece_service.generating:
+            await asyncio.sleep(0.01)
+        return slow, busy, still_running, await get(port, '/piece?mood=happy&seed=2&bars=1')
+
+    slow, busy, still_running, after = run(scenario, wait_timeout=0.05, max_bars=3000)
+    assert slow[0] == 503 and busy[0] == 503 and still_running == 1
+    assert after[0] == 200
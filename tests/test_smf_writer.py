@@ -0,0 +1,46 @@
+import io
+
+import numpy as np
+import pytest
+
+import engine
+import smf_writer
+from event_buffer import EventBuffer
+
+
+def mido_bytes(tracks, tempo):
+    out = io.BytesIO()
+    smf_writer.to_midi_file(tracks, tempo).save(file=out)
+    return out.getvalue()
+
+
+@pytest.mark.parametrize('mood', sorted(engine.moods))
+def test_generated_files_match_mido(mood):
+    for seed in range(3):
+        tracks, _ = engine.compose_events(mood, seed, 8)
+        tempo = engine.mood_module(mood).tempo
+        assert smf_writer.encode_file(tracks, tempo) == mido_bytes(tracks, tempo)
+
+
+def test_every_delta_size_and_status_matches_mido():
+    rng = np.random.default_rng(0)
+    count = 2000
+    statuses = rng.choice([0x80, 0x90, 0xA0, 0xB0, 0xC0, 0xD0, 0xE0], count) | rng.integers(0, 3, count)
+    deltas = rng.choice([0, 0x7F, 0x80, 0x3FFF, 0x4000, 0x1FFFFF, 0x200000, smf_writer.max_delta], count)
+    events = np.stack([deltas, statuses, rng.integers(0, 128, count), rng.integers(0, 128, count)], axis=1)
+    assert smf_writer.encode_file([events], 500000) == mido_bytes([events], 500000)
+
+
+def test_deltas_beyond_four_vlq_bytes_are_rejected():
+    events = [[smf_writer.max_delta + 5, 0x90, 60, 100]]
+    with pytest.raises(ValueError, match='variable-length'):
+        smf_writer.encode_track(events)
+    with pytest.raises(ValueError):
+        EventBuffer(events)
+
+
+def test_buffer_iterates_across_blocks():
+    events = smf_writer.event_array([(i, 0x90 | i % 16, i % 128, 100) for i in range(10000)])
+    buffer = EventBuffer(events)
+    assert list(buffer) == [tuple(event) for event in events.tolist()]
+    assert list(buffer.__iter__(block=3)) == list(buffer)
@@ -0,0 +1,53 @@
+import os
+
+import pytest
+
+import engine
+import streaming
+from benchmarks.check_streaming import _isolated, check_chunks, stream_piece
+from mood_profiles import track_names
+
+
+@pytest.mark.parametrize('mood', sorted(engine.moods))
+def test_streamed_piece_is_well_formed(tmp_path, mood):
+    path = str(tmp_path / 'piece.mid')
+    choices = streaming.write_long_piece(path, mood, 1, 20)
+    assert check_chunks(path) == len(track_names)
+    assert set(choices) >= {'main', 'background'}
+
+
+@pytest.mark.slow
+def test_peak_memory_does_not_grow_with_length(tmp_path):
+    # Each piece in a fresh process, so ru_maxrss is that piece's peak alone
+    short, long = (_isolated(stream_piece, 'happy', bars, str(tmp_path)) for bars in (1000, 100000))
+    assert long['tracks'] == len(track_names)
+    assert long['bytes'] > 50 * short['bytes']
+    assert long['peak_rss_kb'] - short['peak_rss_kb'] < 16 * 1024
+
+
+def test_block_size_does_not_change_the_piece(tmp_path):
+    paths = [str(tmp_path / f"{block}.mid") for block in (37, 4096)]
+    for path, block in zip(paths, (37, 4096)):
+        streaming.write_long_piece(path, 'happy', 3, 40, block_notes=block)
+    first, second = (open(path, 'rb').read() for path in paths)
+    assert first == second
+
+
+def test_melody_length_follows_bars():
+    module = engine.mood_module('moody')
+    _, blocks = streaming.piece_blocks('moody', 5, 30, block_notes=50)
+    main = track_names.index('main')
+    note_ons = sum(int(((block[main][:, 1] & 0xF0) == 0x90).sum()) for block in blocks)
+    assert note_ons == 30 * module.notes_per_bar
+
+
+def test_failure_leaves_no_output(tmp_path, monkeypatch):
+    module = engine.mood_module('happy')
+
+    def broken(*args):
+        raise RuntimeError('harmony failed')
+
+    monkeypatch.setattr(module, 'generate_background_melody', broken)
+    with pytest.raises(RuntimeError):
+        streaming.write_long_piece(str(tmp_path / 'piece.mid'), 'happy', 1, 20)
+    assert os.listdir(tmp_path) == []
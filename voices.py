@@ -0,0 +1,47 @@
+"""Derive every melodic layer of a piece from its main melody in one pass.
+
+The five melodic tracks (the melody, its octave layers, the background
+harmony and the complementary line) are built together as one
+``(layer, note)`` structured array of pitch, velocity and note_on/note_off
+deltas.  ``smf_writer.layer_events`` turns it into event arrays.
+"""
+import functools
+
+import numpy as np
+
+import scale_tables
+
+layer_names = ['main', 'main2', 'main3', 'background', 'second']
+note_dtype = np.dtype([('note', np.int16), ('velocity', np.int16), ('on_delta', np.int32), ('off_delta', np.int32)])
+
+
+def layer_pitches(melody, table, background_intervals, complementary_intervals, start=0):
+    """Return the ``(5, len(melody))`` pitches of the layers, in ``layer_names`` order."""
+    melody = np.asarray(melody, dtype=np.int64)
+    return np.stack([melody,
+                     scale_tables.octave_down[melody],
+                     scale_tables.octave_up[melody],
+                     table.apply(melody, background_intervals, start),
+                     table.apply(melody, complementary_intervals, start)])
+
+
+def draw_integers(rng, layer_ranges, count):
+    """Return ``rng.randint`` draws shaped ``(layers, count, draws per note)``.
+
+    ``layer_ranges`` holds, for each layer, the ``(low, high)`` ranges drawn
+    for every note.  Draws are made layer by layer and note by note, the
+    order in which the tracks used to be written one at a time.
+    """
+    calls = [[functools.partial(rng.randint, low, high) for low, high in ranges] for ranges in layer_ranges]
+    values = [call() for per_note in calls for _ in range(count) for call in per_note]
+    return np.array(values, dtype=np.int64).reshape(len(layer_ranges), count, len(layer_ranges[0]))
+
+
+def layer_notes(pitches, velocities, on_deltas, off_deltas):
+    """Pack per-layer fields (arrays broadcastable to ``pitches``) into a ``note_dtype`` array."""
+    notes = np.empty(pitches.shape, dtype=note_dtype)
+    notes['note'] = pitches
+    notes['velocity'] = velocities
+    notes['on_delta'] = on_deltas
+    notes['off_delta'] = off_deltas
+    return notes